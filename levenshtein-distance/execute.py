@@ -11,7 +11,7 @@ del_cost = 1
 rep_cost = 2
 
 # Getting matrix and getting minimum edit distance
-matrix, min_edits = min_edit_distance(source, target, ins_cost, del_cost, rep_cost)
+matrix, min_edits = min_edit_distance(source, target, ins_cost, del_cost, rep_cost, full_matrix=True)
 
 # Levehnstein score as a percentage
 max_edit_distance = min(len(source), len(target)) * rep_cost + abs(len(source) - len(target))
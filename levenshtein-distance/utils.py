@@ -1,6 +1,60 @@
+import re
 import numpy as np
 
-def min_edit_distance(source, target, ins_cost, del_cost, rep_cost):
+# Word-level tokenizer: runs of word characters, or any single non-space symbol (punctuation)
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def encode_string(text):
+    '''
+    Input:
+        text: a string to be converted into an array of character codes
+    Output:
+        codes: a NumPy uint32 array with the Unicode code point of every character
+    '''
+
+    # UTF-32 stores every character in exactly 4 bytes, so the buffer can be read straight as uint32 code points
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+    return codes
+
+
+def edit_distance_row(source_codes, target_codes, ins_cost, del_cost, rep_cost):
+    '''
+    Input:
+        source_codes: a NumPy array with the encoded source string
+        target_codes: a NumPy array with the encoded target string
+        ins_cost: an integer setting the insert cost
+        del_cost: an integer setting the delete cost
+        rep_cost: an integer setting the replace cost
+    Output:
+        row: a NumPy array of len(target)+1 with the last row of the cost matrix
+    '''
+
+    n = len(target_codes)
+
+    # Column offsets used to turn the insertion recurrence into a cumulative minimum
+    offsets = np.arange(n+1) * ins_cost
+
+    # Row 0 of the cost matrix: inserting every character of the target
+    row = offsets.copy()
+
+    # Keeping only two rows alive (the previous one and the one being built)
+    for i in range(len(source_codes)):
+        # Replacement cost per column: 0 where the characters match, rep_cost otherwise
+        r_cost = np.where(target_codes == source_codes[i], 0, rep_cost)
+
+        # Best cost coming from the row above (deletion) or from the diagonal (replacement/match)
+        new_row = np.empty(n+1, dtype=row.dtype)
+        new_row[0] = row[0] + del_cost
+        new_row[1:] = np.minimum(row[1:] + del_cost, row[:-1] + r_cost)
+
+        # Insertions chain from left to right: D[col] = min over j <= col of D[j] + (col - j) * ins_cost
+        row = np.minimum.accumulate(new_row - offsets) + offsets
+
+    return row
+
+
+def min_edit_distance(source, target, ins_cost, del_cost, rep_cost, full_matrix=False):
     '''
     Input: 
         source: a string corresponding to the string you are starting with
@@ -8,11 +62,23 @@ def min_edit_distance(source, target, ins_cost, del_cost, rep_cost):
         ins_cost: an integer setting the insert cost
         del_cost: an integer setting the delete cost
         rep_cost: an integer setting the replace cost
+        full_matrix: if True, the whole cost matrix is built and returned along with the distance
     Output:
-        D: a matrix of len(source)+1 by len(target)+1 containing minimum edit distances
+        D: a matrix of len(source)+1 by len(target)+1 containing minimum edit distances (only if full_matrix is True)
         med: the minimum edit distance (med) required to convert the source string to the target
     '''
-    
+
+    # Distance-only mode with unit costs: using the bit-parallel backend and scaling by the common cost
+    if not full_matrix and ins_cost == del_cost == rep_cost:
+        med = myers_edit_distance(source, target) * rep_cost
+        return med
+
+    # Distance-only mode: keeping two rolling rows instead of the full matrix (O(n) memory)
+    if not full_matrix:
+        row = edit_distance_row(encode_string(source), encode_string(target), ins_cost, del_cost, rep_cost)
+        med = int(row[-1])
+        return med
+
     m = len(source) 
     n = len(target)
     
@@ -42,15 +108,394 @@ def min_edit_distance(source, target, ins_cost, del_cost, rep_cost):
                 r_cost = 0
             
             # Updating the cost at row, col based on previous entries in the cost matrix            
-            mins_list = []
             min_del = D[row-1, col] + del_cost
             min_ins = D[row, col-1] + ins_cost
             min_rep = D[row-1, col-1] + r_cost
-            mins_list.extend((min_del, min_ins, min_rep))
             
-            D[row,col] = min(mins_list)
+            D[row,col] = min(min_del, min_ins, min_rep)
           
     # Setting the minimum edit distance with the cost found at row m, column n
     med = D[m,n]
     
     return D, med
+
+
+def encode_batch(strings, pad_value):
+    '''
+    Input:
+        strings: a list of strings to be encoded
+        pad_value: an integer used to fill the positions after the end of each string
+    Output:
+        codes: a NumPy int64 matrix of len(strings) by the longest length with the encoded strings
+        lengths: a NumPy array with the length of every string
+    '''
+
+    lengths = np.array([len(s) for s in strings], dtype=np.int64)
+    width = int(lengths.max()) if len(strings) > 0 else 0
+
+    # Filling the matrix with the padding value and copying each encoded string at the beginning of its row
+    codes = np.full((len(strings), width), pad_value, dtype=np.int64)
+    for i, s in enumerate(strings):
+        codes[i, :len(s)] = encode_string(s)
+
+    return codes, lengths
+
+
+def levenshtein_similarity(min_edits, source_len, target_len, rep_cost):
+    '''
+    Input:
+        min_edits: the minimum edit distance (or an array of them)
+        source_len: the length of the source string (or an array of them)
+        target_len: the length of the target string (or an array of them)
+        rep_cost: an integer setting the replace cost
+    Output:
+        lev_similarity: the Levenshtein similarity as a percentage, as computed in execute.py
+    '''
+
+    # Maximum edit distance: replacing every character of the shortest string plus the length difference
+    max_edit_distance = np.minimum(source_len, target_len) * rep_cost + np.abs(np.subtract(source_len, target_len))
+
+    # Two empty strings are identical, so avoiding the division by zero and giving them a distance of 0%
+    lev_distance = np.round(np.divide(min_edits, max_edit_distance, out=np.zeros(np.shape(min_edits)), where=max_edit_distance > 0) * 100, 2)
+    lev_similarity = np.round(100 - lev_distance, 2)
+
+    return lev_similarity
+
+
+def batch_edit_distance(sources, targets, ins_cost, del_cost, rep_cost, similarity=False):
+    '''
+    Input:
+        sources: a list of strings you are starting with
+        targets: a list of strings you are ending with (same length as sources)
+        ins_cost: an integer setting the insert cost
+        del_cost: an integer setting the delete cost
+        rep_cost: an integer setting the replace cost
+        similarity: if True, the Levenshtein similarity (%) is returned instead of the distance
+    Output:
+        result: a NumPy array with the minimum edit distance (or similarity) of every (source, target) pair
+    '''
+
+    if len(sources) != len(targets):
+        raise ValueError("sources and targets must have the same number of strings")
+
+    # Padding with different negative values so padded positions never match each other nor a real character
+    source_codes, source_lens = encode_batch(sources, -1)
+    target_codes, target_lens = encode_batch(targets, -2)
+
+    pairs, n = target_codes.shape
+
+    # Column offsets used to turn the insertion recurrence into a cumulative minimum
+    offsets = np.arange(n+1, dtype=np.int64) * ins_cost
+
+    # Row 0 of the cost matrix for every pair at once
+    rows = np.tile(offsets, (pairs, 1))
+
+    # Advancing the DP one source position at a time for all pairs together
+    for i in range(source_codes.shape[1]):
+        # Replacement cost per pair and column
+        r_cost = np.where(target_codes == source_codes[:, i:i+1], 0, rep_cost)
+
+        new_rows = np.empty_like(rows)
+        new_rows[:, 0] = rows[:, 0] + del_cost
+        new_rows[:, 1:] = np.minimum(rows[:, 1:] + del_cost, rows[:, :-1] + r_cost)
+        new_rows = np.minimum.accumulate(new_rows - offsets, axis=1) + offsets
+
+        # Pairs whose source is already exhausted keep their final row
+        active = (i < source_lens)[:, None]
+        rows = np.where(active, new_rows, rows)
+
+    # The distance of every pair sits at the column matching its target length
+    min_edits = rows[np.arange(pairs), target_lens]
+
+    if similarity:
+        return levenshtein_similarity(min_edits, source_lens, target_lens, rep_cost)
+
+    return min_edits
+
+
+def bounded_edit_distance(source, target, ins_cost, del_cost, rep_cost, max_cost):
+    '''
+    Input:
+        source: a string corresponding to the string you are starting with
+        target: a string corresponding to the string you are ending with
+        ins_cost: an integer setting the insert cost
+        del_cost: an integer setting the delete cost
+        rep_cost: an integer setting the replace cost
+        max_cost: the maximum edit distance we are interested in
+    Output:
+        med: the minimum edit distance if it is less than or equal to max_cost, or None otherwise
+    '''
+
+    m = len(source)
+    n = len(target)
+
+    # Skipping the pair straight away if the length difference alone already costs more than allowed
+    if (n - m) * ins_cost > max_cost or (m - n) * del_cost > max_cost:
+        return None
+
+    # Lower bound of any path going through a diagonal d = col - row: reaching the diagonal plus getting back to the final one
+    diagonals = np.arange(-m, n+1)
+    to_diagonal = np.where(diagonals > 0, diagonals * ins_cost, -diagonals * del_cost)
+    remaining = (n - m) - diagonals
+    from_diagonal = np.where(remaining > 0, remaining * ins_cost, -remaining * del_cost)
+    band = diagonals[to_diagonal + from_diagonal <= max_cost]
+    d_lo, d_hi = int(band[0]), int(band[-1])
+
+    source_codes = encode_string(source)
+    target_codes = encode_string(target)
+
+    # Value used for the cells outside the band (large enough to never be chosen, small enough to never overflow)
+    inf = max_cost + max(ins_cost, del_cost, rep_cost) + 1
+
+    # Row 0 of the cost matrix restricted to the band
+    prev = np.full(n+1, inf, dtype=np.int64)
+    hi = min(n, d_hi)
+    prev[:hi+1] = np.arange(hi+1) * ins_cost
+    cur = np.full(n+1, inf, dtype=np.int64)
+
+    for row in range(1, m+1):
+        lo = max(0, row + d_lo)
+        hi = min(n, row + d_hi)
+
+        # Column 0 is only reachable by deleting every source character so far
+        start = lo
+        if lo == 0:
+            cur[0] = prev[0] + del_cost
+            start = 1
+
+        if start <= hi:
+            # Replacement cost for the band columns of this row
+            r_cost = np.where(target_codes[start-1:hi] == source_codes[row-1], 0, rep_cost)
+            cur[start:hi+1] = np.minimum(prev[start:hi+1] + del_cost, prev[start-1:hi] + r_cost)
+
+        # Insertions chain from left to right inside the band
+        offsets = np.arange(hi - lo + 1) * ins_cost
+        cur[lo:hi+1] = np.minimum.accumulate(cur[lo:hi+1] - offsets) + offsets
+
+        # Making sure the column right after the band is not read as a stale value by the next row
+        if hi + 1 <= n:
+            cur[hi+1] = inf
+
+        # Early exit: if every cell of the band exceeds the bound, the final cost will too
+        if cur[lo:hi+1].min() > max_cost:
+            return None
+
+        prev, cur = cur, prev
+
+    med = int(prev[n])
+    if med > max_cost:
+        return None
+
+    return med
+
+
+def build_pattern_masks(pattern):
+    '''
+    Input:
+        pattern: the string to be compared against one or many texts
+    Output:
+        peq: a dictionary that maps every character of the pattern to a bit mask with the positions where it appears
+    '''
+
+    peq = {}
+    for i, char in enumerate(pattern):
+        peq[char] = peq.get(char, 0) | (1 << i) # setting bit i for the character at position i
+
+    return peq
+
+
+def myers_edit_distance(pattern, text, peq=None):
+    '''
+    Input:
+        pattern: a string corresponding to the string you are starting with
+        text: a string corresponding to the string you are ending with
+        peq: optional bit masks from build_pattern_masks(pattern), to reuse them across many texts
+    Output:
+        med: the unit-cost minimum edit distance (insert, delete and replace all cost 1)
+    '''
+
+    m = len(pattern)
+    if m == 0:
+        return len(text)
+
+    if peq is None:
+        peq = build_pattern_masks(pattern)
+
+    # Python integers have arbitrary precision, so patterns longer than 64 characters are simply processed
+    # as multi-word bit vectors (one machine word of the pattern at a time under the hood)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+
+    # Vertical deltas of the current column: all +1 at the start (column 0 is 0, 1, 2, ..., m)
+    pv = mask
+    mv = 0
+    score = m
+
+    for char in text:
+        eq = peq.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+
+        # Horizontal deltas
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+
+        # Updating the score with the delta of the last row
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+
+        # Shifting the horizontal deltas (row 0 always increases by 1 for the global distance)
+        ph = ((ph << 1) | 1) & mask
+        mh = (mh << 1) & mask
+
+        # Vertical deltas of the next column
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+
+    return score
+
+
+def myers_edit_distance_many(pattern, texts):
+    '''
+    Input:
+        pattern: a string to be compared against every text
+        texts: a list of strings
+    Output:
+        distances: a list with the unit-cost minimum edit distance between the pattern and every text
+    '''
+
+    # Building the pattern bit masks only once for the whole list of texts
+    peq = build_pattern_masks(pattern)
+    distances = [myers_edit_distance(pattern, text, peq=peq) for text in texts]
+
+    return distances
+
+
+def backtrace_alignment(source, target, ins_cost, del_cost, rep_cost):
+    '''
+    Input:
+        source: a (short) string corresponding to the string you are starting with
+        target: a (short) string corresponding to the string you are ending with
+        ins_cost: an integer setting the insert cost
+        del_cost: an integer setting the delete cost
+        rep_cost: an integer setting the replace cost
+    Output:
+        ops: a list of tuples (operation, source character, target character) transforming source into target
+    '''
+
+    # Building the full cost matrix, which is fine for the small subproblems this is called with
+    D, med = min_edit_distance(source, target, ins_cost, del_cost, rep_cost, full_matrix=True)
+
+    # Walking back from the bottom-right corner and choosing the move that explains each cost
+    ops = []
+    row, col = len(source), len(target)
+    while row > 0 or col > 0:
+        if row > 0 and col > 0:
+            same = source[row-1] == target[col-1]
+            r_cost = 0 if same else rep_cost
+            if D[row, col] == D[row-1, col-1] + r_cost:
+                ops.append(('match' if same else 'replace', source[row-1], target[col-1]))
+                row, col = row-1, col-1
+                continue
+        if row > 0 and D[row, col] == D[row-1, col] + del_cost:
+            ops.append(('delete', source[row-1], None))
+            row -= 1
+        else:
+            ops.append(('insert', None, target[col-1]))
+            col -= 1
+
+    ops.reverse()
+
+    return ops
+
+
+def hirschberg_alignment(source, target, ins_cost, del_cost, rep_cost):
+    '''
+    Input:
+        source: a string corresponding to the string you are starting with
+        target: a string corresponding to the string you are ending with
+        ins_cost: an integer setting the insert cost
+        del_cost: an integer setting the delete cost
+        rep_cost: an integer setting the replace cost
+    Output:
+        med: the minimum edit distance required to convert the source string to the target
+        ops: a list of tuples (operation, source character, target character) where operation is one of
+             'match', 'replace', 'delete' or 'insert' (the missing character is None)
+    '''
+
+    source_codes = encode_string(source)
+    target_codes = encode_string(target)
+    ops = []
+
+    # Subproblems are kept in a stack (source and target ranges) so that the edit script is built from left to right
+    stack = [(0, len(source), 0, len(target))]
+    while stack:
+        s_lo, s_hi, t_lo, t_hi = stack.pop()
+        m = s_hi - s_lo
+        n = t_hi - t_lo
+
+        # Small subproblems are solved directly with the full matrix and a backtrace
+        if m <= 1 or n <= 1:
+            ops += backtrace_alignment(source[s_lo:s_hi], target[t_lo:t_hi], ins_cost, del_cost, rep_cost)
+            continue
+
+        # Splitting the source in half and finding where the optimal path crosses the middle row,
+        # using the last row of the forward DP and the last row of the DP over the reversed strings
+        s_mid = s_lo + m // 2
+        forward = edit_distance_row(source_codes[s_lo:s_mid], target_codes[t_lo:t_hi], ins_cost, del_cost, rep_cost)
+        backward = edit_distance_row(source_codes[s_mid:s_hi][::-1], target_codes[t_lo:t_hi][::-1], ins_cost, del_cost, rep_cost)
+        t_mid = t_lo + int(np.argmin(forward + backward[::-1]))
+
+        # Pushing the right half first so the left half is processed (and appended) first
+        stack.append((s_mid, s_hi, t_mid, t_hi))
+        stack.append((s_lo, s_mid, t_lo, t_mid))
+
+    # Adding up the cost of the edit script
+    costs = {'match': 0, 'replace': rep_cost, 'delete': del_cost, 'insert': ins_cost}
+    med = sum(costs[op[0]] for op in ops)
+
+    return med, ops
+
+
+def encode_tokens(text, token_vocab):
+    '''
+    Input:
+        text: a string to be split into words
+        token_vocab: a dictionary shared across calls that maps every token to an integer id (updated in place)
+    Output:
+        ids: a NumPy int32 array with the id of every token in the text
+    '''
+
+    ids = []
+    for token in TOKEN_PATTERN.findall(text):
+        # Interning the token: unseen tokens get the next free id
+        token_id = token_vocab.get(token)
+        if token_id is None:
+            token_id = len(token_vocab)
+            token_vocab[token] = token_id
+        ids.append(token_id)
+
+    return np.array(ids, dtype=np.int32)
+
+
+def token_edit_distance(source_ids, target_ids, ins_cost, del_cost, rep_cost):
+    '''
+    Input:
+        source_ids: a NumPy array with the token ids of the source segment (from encode_tokens)
+        target_ids: a NumPy array with the token ids of the target segment (from encode_tokens, same token_vocab)
+        ins_cost: an integer setting the insert cost
+        del_cost: an integer setting the delete cost
+        rep_cost: an integer setting the replace cost
+    Output:
+        med: the word-level minimum edit distance
+        lev_similarity: the word-level Levenshtein similarity (%)
+    '''
+
+    # The DP only compares integer ids, so it can reuse the character-level row computation
+    row = edit_distance_row(source_ids, target_ids, ins_cost, del_cost, rep_cost)
+    med = int(row[-1])
+    lev_similarity = float(levenshtein_similarity(med, len(source_ids), len(target_ids), rep_cost))
+
+    return med, lev_similarity
@@ -1,50 +1,147 @@
-import nltk
+import os
 from utils import *
 
-### CLEANING AND PRE-PROCESSING THE DATA ###
+# Set to True to read and count the corpus chunk by chunk (peak memory depends on the chunk size, not on the corpus size)
+stream_corpus = False
 
-# Loading the data
-with open("dataset/movie_lines.txt", "r", encoding="utf-8") as f:
-    data = f.read()
+# Set to True to save the n-gram trie as a binary model file (only when the corpus is not streamed)
+save_model = False
 
-# Tokenizing the data and retrieving a list of sentences where each entry is a again a list of tokens
-print('Tokenizing data...\n')
-tokenized_data = get_tokenized_data(data)
+# Set to True to keep the tokenized and encoded corpus in cache_dir, so the next runs skip tokenization and preprocessing
+use_corpus_cache = True
 
-# Specifying the size of the data: 99% for training and 1% for testing
-train_size = int(len(tokenized_data) * 0.99)
-train_data = tokenized_data[0:train_size]
-test_data = tokenized_data[train_size:]
-
-print("Data size:", len(tokenized_data))
-print("Training set:", len(train_data))
-print("Testing set:", len(test_data), '\n')
-
-# Replacing word under the minimum frequency with <unk> tokens for training and testing sets
+corpus_path = "dataset/movie_lines.txt"
+cache_dir = "dataset/cache"
+model_path = "dataset/ngram_model.bin"
 minimum_freq = 2
-train_set, test_set, vocabulary = preprocess_data(train_data, test_data, minimum_freq)
-
 
-### DEVELOPING N-GRAM BASED LANGUAGE MODEL ###
+if stream_corpus == True:
+    ### STREAMING THE DATA AND DEVELOPING N-GRAM BASED LANGUAGE MODEL ###
+    print('Streaming and counting data...\n')
+    
+    # Every 100th sentence is kept for testing (deterministic 99%/1% split) and the rest is counted chunk by chunk
+    vocabulary, n_gram_counts_list = count_n_grams_streaming(corpus_path, [3, 4, 5], minimum_freq, chunk_size=10000, test_every=100)
+    
+    # The testing set is small enough (1%) to be kept in memory
+    test_data = [sentence for chunk in stream_tokenized_chunks(corpus_path, "test", test_every=100) for sentence in chunk]
+    test_set = replace_oov_words_by_unk(test_data, vocabulary, unknown_token="<unk>")
+    
+    print("Vocabulary size:", len(vocabulary))
+    print("Testing set:", len(test_set), '\n')
 
-# Implementing n-gram model
-n_gram_counts_list = []
-for n in range(3, 6):
-    print("Computing n-gram counts with n =", n, "...")
-    n_model_counts = count_n_grams(train_set, n)
-    n_gram_counts_list.append(n_model_counts)
+else:
+    ### CLEANING AND PRE-PROCESSING THE DATA ###
+    
+    # The encoded corpus is cached by the hash of the corpus file and the preprocessing parameters
+    cache_key = corpus_cache_key(corpus_path, {"minimum_freq": minimum_freq, "tokenizer": "regex", "train_ratio": 0.99})
+    corpus_cache = load_corpus_cache(cache_dir, cache_key) if use_corpus_cache == True else None
+    
+    if corpus_cache is None:
+        # Loading the data
+        with open(corpus_path, "r", encoding="utf-8") as f:
+            data = f.read()
+        
+        # Tokenizing the data and retrieving a list of sentences where each entry is a again a list of tokens
+        print('Tokenizing data...\n')
+        tokenized_data = get_tokenized_data(data)
+        
+        # Specifying the size of the data: 99% for training and 1% for testing
+        train_size = int(len(tokenized_data) * 0.99)
+        train_data = tokenized_data[0:train_size]
+        test_data = tokenized_data[train_size:]
+        
+        print("Data size:", len(tokenized_data))
+        print("Training set:", len(train_data))
+        print("Testing set:", len(test_data), '\n')
+        
+        # Replacing word under the minimum frequency with <unk> tokens for training and testing sets
+        train_set, test_set, vocabulary = preprocess_data(train_data, test_data, minimum_freq)
+        
+        # Encoding the training set with integer ids and saving everything for the next runs
+        id_to_word, word_to_id = build_vocabulary_index(vocabulary)
+        train_tokens, train_offsets = encode_corpus(train_set, word_to_id)
+        if use_corpus_cache == True:
+            save_corpus_cache(cache_dir, cache_key, id_to_word, train_set, test_set)
+    
+    else:
+        # Reading the encoded corpus directly (no tokenization needed)
+        print('Loading cached corpus...\n')
+        id_to_word = corpus_cache["id_to_word"]
+        train_tokens, train_offsets = corpus_cache["train"]
+        test_set = decode_corpus(*corpus_cache["test"], id_to_word)
+        vocabulary = [word for word in id_to_word if word not in ('<s>', '<e>', "<unk>")]
+        
+        print("Training set:", len(train_offsets) - 1)
+        print("Testing set:", len(test_set), '\n')
+    
+    
+    ### DEVELOPING N-GRAM BASED LANGUAGE MODEL ###
+    
+    # Implementing n-gram model: all the orders up to 5 are counted once and stored in a single integer-id trie
+    print("Computing n-gram counts up to n = 5 ...")
+    n_gram_trie = build_ngram_trie_encoded(split_corpus(train_tokens, train_offsets), id_to_word, 5)
+    n_gram_counts_list = [NGramTrieCounts(n_gram_trie, n) for n in range(3, 6)] # read-only views behaving like the count_n_grams dictionaries
+    
+    # Suffix array over the training set: counts of n-grams of any order are found by binary search at query time
+    suffix_array_dir = os.path.join(cache_dir, cache_key, "suffix_array")
+    suffix_array_index = load_suffix_array_index(suffix_array_dir) if use_corpus_cache == True else None
+    if suffix_array_index is None:
+        print("Building suffix array ...")
+        suffix_array_index = build_suffix_array_index(train_tokens, train_offsets, id_to_word)
+        if use_corpus_cache == True:
+            save_suffix_array_index(suffix_array_index, suffix_array_dir)
+    
+    # Evaluating the perplexity of the testing set for every model order and several smoothing values at once
+    k_values = [1.0, 0.1, 0.01]
+    for n in range(3, 5):
+        perplexities = evaluate_perplexity(test_set, n_gram_trie, n, k_values)
+        print("Perplexity with n =", n, "for k =", k_values, ":", [round(float(p), 2) for p in perplexities])
+    
+    # Saving the trie as a binary file that load_ngram_trie can memory-map at startup instead of recounting the corpus
+    if save_model == True:
+        save_ngram_trie(n_gram_trie, model_path, k=1.0)
 
 ### TESTING THE LANGUAGE MODEL ###
 
 # Entering and cleaning input sentence
 sentence = "It will take a little"
 sentence = sentence.lower()
-previous_tokens = nltk.word_tokenize(sentence)
+previous_tokens = tokenize_sentences([sentence])[0] # same tokenizer backend used for the training data
 print('\nStart of the sentence:', previous_tokens)
+input_tokens = list(previous_tokens) # keeping the input, since previous_tokens is extended while generating
+
+# Set to True to pick every next word with stupid backoff (highest order first) instead of merging k-smoothed suggestions
+use_stupid_backoff = False
+
+# Words observed after every n-gram, indexed once for stupid backoff (the trie views already give them directly)
+if use_stupid_backoff == True and stream_corpus == True:
+    successor_indexes = [build_successor_index(n_plus1_gram_counts) for n_plus1_gram_counts in n_gram_counts_list[1:]]
+else:
+    successor_indexes = None
+
+# Set to True to pick every next word from the longest context of the input found in the suffix array (any length)
+use_longest_context = False
+
+# Bounded LRU cache of suggestions by context, reused across the generation steps
+suggestion_cache = SuggestionCache(maxsize=10000)
 
 # Generating text
 while True:
-    suggestions = get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0) # getting the suggestions as a list
+    if use_stupid_backoff == True:
+        suggestions = stupid_backoff_suggestions(previous_tokens, n_gram_counts_list, alpha=0.4, successor_indexes=successor_indexes)
+        if len(suggestions) == 0 or suggestions[0][0] == "<e>" or len(set(previous_tokens[-3:])) == 1: # nothing to suggest, end of sentence or probable infinite loop
+            break
+        previous_tokens.append(suggestions[0][0])
+        continue
+    
+    if use_longest_context == True and stream_corpus == False:
+        suggestions = suffix_array_suggestions(previous_tokens, suffix_array_index, k=1.0)
+        if len(suggestions) == 0 or suggestions[0][0] == "<e>" or len(set(previous_tokens[-3:])) == 1: # nothing to suggest, end of sentence or probable infinite loop
+            break
+        previous_tokens.append(suggestions[0][0])
+        continue
+    
+    suggestions = suggestion_cache.get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0) # getting the suggestions as a list (cached by context)
     suggestions_dict = {} # initializing the suggestions dictionary
     for suggestion in suggestions: # looping through the suggestions and populating the suggestions dictionary
         word, prob = suggestion[0], suggestion[1] # since every suggestion (within the suggestions list) is made of a tuple (word, probability)
@@ -61,3 +158,16 @@ while True:
         previous_tokens.append(word) # appending the next word to the previous tokens for the next loop
 
 print(previous_tokens)
+print('Suggestion cache:', suggestion_cache.stats())
+
+# Generating several candidate continuations with beam search over the 5-gram counts (only when the trie is available)
+if stream_corpus == False:
+    print('\nBeam search continuations:')
+    for tokens, log_prob in beam_search(input_tokens, n_gram_trie, 4, k=1.0, beam_width=3):
+        print(tokens, round(log_prob, 2))
+    
+    # Whole next-word distribution of the input (float32 vector indexed by word id): top words and entropy
+    distribution = estimate_distribution(input_tokens, n_gram_trie, 3, k=1.0)
+    top_ids, top_probs = distribution_top_k(distribution, 5)
+    print('\nMost likely next words:', [(n_gram_trie["id_to_word"][i], round(float(p), 4)) for i, p in zip(top_ids, top_probs)])
+    print('Entropy of the next word (bits):', round(float(distribution_entropy(distribution)), 2))
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import time
+import numpy as np
+from collections import deque
+from utils import *
+
+# Binary model saved by execute.py (set save_model to True there) and settings of the service
+model_path = "dataset/ngram_model.bin"
+host = "127.0.0.1"
+port = 8765
+n = 4 # number of words of the context (the model must have orders up to n+1)
+k = 1.0 # smoothing parameter
+max_batch_size = 64 # maximum number of requests scored together
+max_wait = 0.005 # maximum time (in seconds) a request waits for other requests to join its batch
+
+# Set to True to send a burst of concurrent requests through a loopback client and print the metrics, or False to keep serving
+run_demo = True
+
+
+class MicroBatchingServer:
+    """
+    Local asyncio service answering next-word suggestion requests (one JSON object per line over TCP)
+
+    Concurrent requests are grouped into micro-batches of at most max_batch_size requests, waiting at most
+    max_wait seconds for a batch to fill up, and every batch is scored in one vectorized pass (suggest_batch).
+
+    Requests: {"tokens": ["it", "will", ...], "start_with": "ta"} (start_with is optional) or {"metrics": true}
+    Responses: {"suggestion": "take", "probability": 0.01} or the metrics
+    """
+
+    def __init__(self, trie, n, k=1.0, max_batch_size=64, max_wait=0.005):
+        self.trie = trie
+        self.n = n
+        self.k = k
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = None
+        self.latencies = deque(maxlen=10000) # seconds from arrival to answer of the last requests
+        self.batch_sizes = deque(maxlen=10000)
+
+    async def start(self, host, port):
+        self.queue = asyncio.Queue()
+        self.batcher = asyncio.create_task(self.batch_loop())
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+
+        return self.server
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher.cancel()
+
+    async def suggest(self, tokens, start_with=None):
+        # Queuing the request and waiting for the batch it ends up in
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((tokens, start_with, future, time.perf_counter()))
+
+        return await future
+
+    async def batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Waiting for a first request, then for more requests until the batch is full or max_wait is over
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # Scoring the whole batch in one pass (in a worker thread so that connections keep being accepted)
+            contexts = [request[0] for request in batch]
+            start_withs = [request[1] for request in batch]
+            try:
+                suggestions = await loop.run_in_executor(None, suggest_batch, contexts, self.trie, self.n, self.k, start_withs)
+            except Exception as error:
+                for request in batch:
+                    request[2].set_exception(error)
+                continue
+
+            now = time.perf_counter()
+            self.batch_sizes.append(len(batch))
+            for (tokens, start_with, future, arrival), suggestion in zip(batch, suggestions):
+                self.latencies.append(now - arrival)
+                future.set_result(suggestion)
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = json.loads(line)
+
+                if request.get("metrics"):
+                    response = self.metrics()
+                else:
+                    suggestion, probability = await self.suggest(request["tokens"], request.get("start_with"))
+                    response = {"suggestion": suggestion, "probability": probability}
+
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def metrics(self):
+        """
+        Get the latency (in milliseconds) and batch size statistics of the last requests
+        """
+        latencies = np.array(self.latencies) * 1000
+        batch_sizes = np.array(self.batch_sizes)
+        if len(latencies) == 0:
+            return {"requests": 0, "batches": 0}
+
+        return {
+            "requests": len(latencies),
+            "batches": len(batch_sizes),
+            "latency_mean_ms": float(latencies.mean()),
+            "latency_p50_ms": float(np.percentile(latencies, 50)),
+            "latency_p99_ms": float(np.percentile(latencies, 99)),
+            "batch_size_mean": float(batch_sizes.mean()),
+            "batch_size_max": int(batch_sizes.max()),
+        }
+
+
+async def request_suggestion(host, port, tokens, start_with=None):
+    """
+    Loopback client: send one suggestion request and get the response
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write((json.dumps({"tokens": tokens, "start_with": start_with}) + "\n").encode("utf-8"))
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+
+    return response
+
+
+async def request_metrics(host, port):
+    """
+    Loopback client: get the metrics of the service
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"metrics": true}\n')
+    await writer.drain()
+    response = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+
+    return response
+
+
+async def main():
+    print('Loading model...')
+    trie = load_ngram_trie(model_path)
+    service = MicroBatchingServer(trie, n, k=k, max_batch_size=max_batch_size, max_wait=max_wait)
+    server = await service.start(host, port)
+    print('Serving suggestions on', host, port)
+
+    if run_demo == True:
+        # Sending many concurrent requests to see them grouped into batches
+        sentences = ["it will take a little", "i do n't know", "what are you", "i want to"]
+        requests = [request_suggestion(host, port, sentence.split()) for sentence in sentences * 50]
+        responses = await asyncio.gather(*requests)
+        for sentence, response in zip(sentences, responses):
+            print(sentence, '->', response)
+        print('Metrics:', await request_metrics(host, port))
+        await service.close()
+    else:
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
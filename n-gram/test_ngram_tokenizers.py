@@ -0,0 +1,41 @@
+import importlib.util
+import os
+import pytest
+from nltk.tokenize.destructive import NLTKWordTokenizer
+
+# Loading n-gram/utils.py under its own name (spell-checker has a utils.py too)
+spec = importlib.util.spec_from_file_location("ngram_utils", os.path.join(os.path.dirname(__file__), "utils.py"))
+utils = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(utils)
+
+# One sentence per entry (the regex backend also splits sentences like nltk.word_tokenize, which needs punkt)
+SENTENCES = [
+    "I can't believe it's not butter.",
+    "You wanna go? I'm gonna stay",
+    "gimme that, lemme see... we cannot",
+    "They'd've said \"hello\" and 'goodbye'",
+    "“Quoted” text with ‘single’ quotes and « guillemets »",
+    "He said: `hi' -- then left; ok?",
+    "Prices rose 3.5% to $1,000.00 (again) [see note] {x} <y>",
+    "it will take a little",
+    "i wanna",
+    "What's that?!",
+    "",
+]
+
+
+@pytest.fixture
+def nltk_word(monkeypatch):
+    # Reference backend: NLTKWordTokenizer is the tokenizer nltk.word_tokenize applies to every sentence
+    tokenizer = NLTKWordTokenizer()
+    monkeypatch.setitem(utils.TOKENIZERS, "nltk_word", lambda sentences: [tokenizer.tokenize(sentence) for sentence in sentences])
+    return "nltk_word"
+
+
+def test_regex_backend_matches_nltk_word_tokenizer(nltk_word):
+    assert utils.compare_tokenizers(SENTENCES, "regex", nltk_word) == []
+
+
+def test_regex_backend_batch_matches_single_calls():
+    assert utils.regex_tokenize_batch(SENTENCES) == [utils.regex_tokenize_batch([sentence])[0] for sentence in SENTENCES]
+    assert utils.regex_tokenize_batch([]) == []
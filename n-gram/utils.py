@@ -1,8 +1,72 @@
+import bisect
+import hashlib
+import json
 import math
+import os
+import pickle
+import uuid
+import zlib
 import random
+import re
+import shutil
+import tempfile
 import numpy as np
 import pandas as pd
 import nltk
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+
+### REGEX TOKENIZER ###
+# Port of the rules used by nltk.word_tokenize (NLTKWordTokenizer), compiled once and applied to a whole batch of
+# sentences joined by line breaks, so "$" and "\s" are restricted to a single line (re.M and [^\S\n])
+
+# Common abbreviations whose period does not end a sentence (emulating the sentence splitting done by nltk before tokenizing)
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "st", "jr", "sr", "vs", "etc", "mt", "prof", "gen", "col", "lt", "sgt", "capt", "rev", "no"}
+SENTENCE_BREAK = re.compile(r"(?:(?<=[?!])|(?<=[^.\s]\.))[\]\)}>\"\'»”’]*(?=\s+\S)")
+LAST_WORD = re.compile(r"(\w+)\.$")
+
+STARTING_QUOTES = [
+    (re.compile("([«“‘„]|[`]+)"), r" \1 "),
+    (re.compile(r"^\"", re.M), r"``"),
+    (re.compile(r"(``)"), r" \1 "),
+    (re.compile(r"([ \(\[{<])(\"|\'{2})"), r"\1 `` "),
+    (re.compile(r"(?i)(?<!\w)(\')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)"), r"\1 "),
+]
+PUNCTUATION = [
+    (re.compile(r'([^\.\n])(\.)([\]\)}>"\'»”’ ]*)[^\S\n]*$', re.M), r"\1 \2 \3 "),
+    (re.compile(r"([:,])([^\d])"), r" \1 \2"),
+    (re.compile(r"([:,])$", re.M), r" \1 "),
+    (re.compile(r"\.{2,}"), r" \g<0> "),
+    (re.compile(r"[;@#$%&]"), r" \g<0> "),
+    (re.compile(r"[\u2012-\u2015]"), r" \g<0> "),
+    (re.compile(r'([^\.\n])(\.)([\]\)}>"\']*)[^\S\n]*$', re.M), r"\1 \2\3 "),
+    (re.compile(r"[?!]"), r" \g<0> "),
+    (re.compile(r"([^'])' "), r"\1 ' "),
+    (re.compile(r"[*]"), r" \g<0> "),
+    (re.compile(r"[\]\[\(\)\{\}\<\>]"), r" \g<0> "),
+    (re.compile(r"--"), r" -- "),
+]
+ENDING_QUOTES = [
+    (re.compile("([»”’])"), r" \1 "),
+    (re.compile(r"''"), " '' "),
+    (re.compile(r'"'), " '' "),
+    (re.compile(r"[^\S\n]+"), " "),
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r"\1 \2 "),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r"\1 \2 "),
+]
+CONTRACTIONS = [re.compile(pattern) for pattern in [
+    r"(?i)\b(can)(?#X)(not)\b",
+    r"(?i)\b(d)(?#X)('ye)\b",
+    r"(?i)\b(gim)(?#X)(me)\b",
+    r"(?i)\b(gon)(?#X)(na)\b",
+    r"(?i)\b(got)(?#X)(ta)\b",
+    r"(?i)\b(lem)(?#X)(me)\b",
+    r"(?i)\b(more)(?#X)('n)\b",
+    r"(?i)\b(wan)(?#X)(na)(?=\s)",
+    r"(?i) ('t)(?#X)(is)\b",
+    r"(?i) ('t)(?#X)(was)\b",
+]]
 
 def split_to_sentences(data):
     """
@@ -23,9 +87,36 @@ def split_to_sentences(data):
     return sentences 
 
 
-def tokenize_sentences(sentences):
+def split_sentence_breaks(sentence):
     """
-    Tokenize sentences into tokens (words)
+    Split a line into the sentences nltk would find in it (after "?", "!" or a period not closing an abbreviation)
+    
+    Args:
+        sentence: str
+    
+    Returns:
+        List of strings
+    """
+    pieces = []
+    start = 0
+    for match in SENTENCE_BREAK.finditer(sentence):
+        piece = sentence[start:match.end()]
+        
+        # Keeping abbreviations and single letters (initials) together with the next words
+        last_word = LAST_WORD.search(piece.rstrip("])}>\"\'»”’"))
+        if last_word is not None and (len(last_word.group(1)) == 1 or last_word.group(1) in ABBREVIATIONS):
+            continue
+        
+        pieces.append(piece)
+        start = match.end()
+    pieces.append(sentence[start:])
+    
+    return pieces
+
+
+def regex_tokenize_batch(sentences):
+    """
+    Tokenize many sentences at once with the precompiled regex rules (same output as nltk.word_tokenize on our data)
     
     Args:
         sentences: List of strings
@@ -34,18 +125,178 @@ def tokenize_sentences(sentences):
         List of lists of tokens
     """
     
-    # Initializing the list of lists of tokenized sentences
+    # Splitting every sentence where nltk would split it and remembering how many pieces belong to each one
+    pieces = []
+    piece_counts = []
+    for sentence in sentences:
+        sentence_pieces = split_sentence_breaks(sentence.replace("\n", " "))
+        pieces += sentence_pieces
+        piece_counts.append(len(sentence_pieces))
+    
+    # Applying every rule only once to the whole batch, one piece per line
+    text = "\n".join(pieces)
+    for regexp, substitution in STARTING_QUOTES + PUNCTUATION:
+        text = regexp.sub(substitution, text)
+    text = " " + text.replace("\n", " \n ") + " "
+    for regexp, substitution in ENDING_QUOTES:
+        text = regexp.sub(substitution, text)
+    for regexp in CONTRACTIONS:
+        text = regexp.sub(r" \1 \2 ", text)
+    
+    # Grouping the tokens of the pieces back into their sentences
+    lines = text.split("\n")
     tokenized_sentences = []
+    position = 0
+    for count in piece_counts:
+        tokens = []
+        for line in lines[position:position + count]:
+            tokens += line.split()
+        tokenized_sentences.append(tokens)
+        position += count
     
-    # Going through each sentence
-    for sentence in sentences:
-        sentence = sentence.lower() # converting to lowercase letters
-        tokenized = nltk.word_tokenize(sentence) # converting into a list of words
-        tokenized_sentences.append(tokenized) # appending the list of words to the list of lists
+    return tokenized_sentences
+
+
+def nltk_tokenize_batch(sentences):
+    """
+    Tokenize many sentences with nltk.word_tokenize, one call per sentence (reference backend)
+    
+    Args:
+        sentences: List of strings
+    
+    Returns:
+        List of lists of tokens
+    """
+    return [nltk.word_tokenize(sentence) for sentence in sentences]
+
+
+# Tokenizer backends that can be chosen by name
+TOKENIZERS = {"regex": regex_tokenize_batch, "nltk": nltk_tokenize_batch}
+
+
+def compare_tokenizers(sentences, backend="regex", reference="nltk"):
+    """
+    Check the parity of a tokenizer backend against the reference one
+    
+    Args:
+        sentences: List of strings
+        backend, reference: names of the tokenizer backends to compare
+    
+    Returns:
+        List of tuples (sentence, reference tokens, backend tokens) for every sentence where they differ
+    """
+    backend_tokens = TOKENIZERS[backend](sentences)
+    reference_tokens = TOKENIZERS[reference](sentences)
+    
+    return [(sentence, expected, tokens) for sentence, expected, tokens in zip(sentences, reference_tokens, backend_tokens) if expected != tokens]
+
+
+def tokenize_sentences(sentences, tokenizer="regex"):
+    """
+    Tokenize sentences into tokens (words)
+    
+    Args:
+        sentences: List of strings
+        tokenizer: name of the tokenizer backend ("regex" or "nltk")
+    
+    Returns:
+        List of lists of tokens
+    """
+    
+    # Converting to lowercase letters and tokenizing all the sentences in one batch
+    tokenized_sentences = TOKENIZERS[tokenizer]([sentence.lower() for sentence in sentences])
     
     return tokenized_sentences
 
 
+def stream_sentences(path, encoding="utf-8"):
+    """
+    Read the sentences of a file lazily, one line at a time
+    
+    Args:
+        path: path to a text file with one sentence per line
+    
+    Yields:
+        Sentences (str) without leading and trailing spaces, skipping the empty ones (same as split_to_sentences)
+    """
+    with open(path, "r", encoding=encoding) as f:
+        for line in f:
+            sentence = line.strip()
+            if len(sentence) > 0:
+                yield sentence
+
+
+def is_test_sentence(index, test_every=100):
+    """
+    Deterministic streaming split: every test_every-th sentence goes to the testing set (1% with the default)
+    """
+    return index % test_every == test_every - 1
+
+
+def stream_tokenized_chunks(path, subset="train", chunk_size=10000, test_every=100):
+    """
+    Read, split and tokenize a file lazily in chunks of sentences
+    
+    Args:
+        path: path to a text file with one sentence per line
+        subset: "train" or "test", which side of the deterministic split to keep
+        chunk_size: number of sentences tokenized at once
+        test_every: every test_every-th sentence belongs to the testing set
+    
+    Yields:
+        Lists of lists of tokens with at most chunk_size sentences
+    """
+    chunk = []
+    for index, sentence in enumerate(stream_sentences(path)):
+        # Keeping only the sentences of the requested subset
+        if is_test_sentence(index, test_every) != (subset == "test"):
+            continue
+        
+        chunk.append(sentence)
+        if len(chunk) == chunk_size:
+            yield tokenize_sentences(chunk)
+            chunk = []
+    
+    if len(chunk) > 0:
+        yield tokenize_sentences(chunk)
+
+
+def count_n_grams_streaming(path, n_values, count_threshold, chunk_size=10000, test_every=100, start_token='<s>', end_token='<e>'):
+    """
+    Build the vocabulary and the n-gram counts of a corpus without loading it into memory
+    
+    The training sentences are read twice: first to count the words and get the closed vocabulary,
+    then to replace the rare words by "<unk>" and count the n-grams, chunk by chunk.
+    
+    Args:
+        path: path to a text file with one sentence per line
+        n_values: list of n-gram orders to be counted
+        count_threshold: words whose count is less than this are treated as unknown
+        chunk_size: number of sentences tokenized and counted at once
+        test_every: every test_every-th sentence is left out for the testing set
+    
+    Returns:
+        Tuple of
+        - vocabulary of words that appear count_threshold times or more in the training data
+        - list of dictionaries with the n-gram counts, one per value of n_values
+    """
+    
+    # First pass: counting the words of the training set
+    word_counts = {}
+    for chunk in stream_tokenized_chunks(path, "train", chunk_size, test_every):
+        count_words(chunk, word_counts)
+    vocabulary = [word for word, cnt in word_counts.items() if cnt >= count_threshold]
+    
+    # Second pass: counting the n-grams of every order over the same chunks once rare words are replaced
+    n_gram_counts_list = [NGramCounts() for n in n_values]
+    for chunk in stream_tokenized_chunks(path, "train", chunk_size, test_every):
+        chunk = replace_oov_words_by_unk(chunk, vocabulary, unknown_token="<unk>")
+        for n, n_gram_counts in zip(n_values, n_gram_counts_list):
+            count_n_grams(chunk, n, start_token, end_token, n_gram_counts)
+    
+    return vocabulary, n_gram_counts_list
+
+
 def get_tokenized_data(data):
     """
     Make a list of tokenized sentences
@@ -66,18 +317,20 @@ def get_tokenized_data(data):
     return tokenized_sentences
 
 
-def count_words(tokenized_sentences):
+def count_words(tokenized_sentences, word_counts=None):
     """
     Count the number of word appearence in the tokenized sentences
     
     Args:
-        tokenized_sentences: List of lists of strings
+        tokenized_sentences: List (or any iterable) of lists of strings
+        word_counts: optional dictionary of counts to be updated, e.g. when counting a corpus chunk by chunk
     
     Returns:
         dict that maps word (str) to the frequency (int)
     """
         
-    word_counts = {}
+    if word_counts is None:
+        word_counts = {}
     
     # Looping through each sentence
     for sentence in tokenized_sentences:
@@ -186,20 +439,79 @@ def preprocess_data(train_data, test_data, count_threshold):
     return train_data_replaced, test_data_replaced, vocabulary
 
 
-def count_n_grams(data, n, start_token='<s>', end_token = '<e>'):
+class NGramCounts(dict):
+    """
+    Dictionary of n-gram counts that records its own updates, so that the caches built on it (see SuggestionCache)
+    can tell when the counts have changed. The token identifies this dictionary (a copy loaded from a pickle
+    gets a new one) and the version is increased every time the dictionary is changed in place. Every assignment
+    is recorded, so bulk updates should go through update (recorded once), as count_n_grams does.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.token = uuid.uuid4().hex
+        self.version = 0
+    
+    def touch(self):
+        self.version += 1
+    
+    def __setitem__(self, n_gram, count):
+        super().__setitem__(n_gram, count)
+        self.touch()
+    
+    def __delitem__(self, n_gram):
+        super().__delitem__(n_gram)
+        self.touch()
+    
+    def __ior__(self, other):
+        super().__ior__(other)
+        self.touch()
+        return self
+    
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.touch()
+    
+    def setdefault(self, n_gram, default=None):
+        if n_gram not in self:
+            self.touch()
+        return super().setdefault(n_gram, default)
+    
+    def pop(self, n_gram, *default):
+        self.touch()
+        return super().pop(n_gram, *default)
+    
+    def popitem(self):
+        self.touch()
+        return super().popitem()
+    
+    def clear(self):
+        super().clear()
+        self.touch()
+    
+    def cache_key(self):
+        return (self.token, self.version, len(self))
+    
+    def __reduce__(self):
+        # Pickled as a plain dictionary (loaded in one go rather than one recorded assignment per item), the copy gets its own token
+        return (self.__class__, (dict(self),))
+
+
+def count_n_grams(data, n, start_token='<s>', end_token = '<e>', n_grams=None):
     """
     Count all n-grams in the data
     
     Args:
-        data: List of lists of tokens
+        data: List (or any iterable) of lists of tokens
         n: number of tokens in a sequence for the n-gram model
+        n_grams: optional dictionary of counts to be updated, e.g. when counting a corpus chunk by chunk
     
     Returns:
-        A dictionary that maps a tuple of n-words to its frequency
+        A dictionary (NGramCounts) that maps a tuple of n-words to its frequency
     """
     
-    # Initializing dictionary of n-grams and their counts
-    n_grams = {}
+    # Initializing dictionary of n-grams and their counts (a plain one, since an NGramCounts records every assignment)
+    counts = {}
     
     # Going through each sentence in the data
     for sentence in data:
@@ -216,10 +528,16 @@ def count_n_grams(data, n, start_token='<s>', end_token = '<e>'):
             n_gram = sentence[i:i+n]
 
             # Checking if the n-gram is in the dictionary
-            if n_gram in n_grams:
-                n_grams[n_gram] += 1 # incrementing the count for this n-gram
+            if n_gram in counts:
+                counts[n_gram] += 1 # incrementing the count for this n-gram
             else:
-                n_grams[n_gram] = 1 # initializing this n-gram count to 1
+                counts[n_gram] = 1 # initializing this n-gram count to 1
+    
+    if n_grams is None:
+        return NGramCounts(counts)
+    
+    # Adding the counts in one update, so that the suggestion caches built on these counts are invalidated once
+    n_grams.update({n_gram: n_grams.get(n_gram, 0) + count for n_gram, count in counts.items()})
     
     return n_grams
 
@@ -293,7 +611,184 @@ def estimate_probabilities(previous_n_gram, n_gram_counts, n_plus1_gram_counts,
     return probabilities
 
 
-def suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabulary, k=1.0, start_with=None):
+def n_gram_order(n_gram_counts):
+    """
+    Get the number of words of the n-grams of a count store (known for views, otherwise taken from the first key)
+    """
+    if hasattr(n_gram_counts, "n"):
+        return n_gram_counts.n
+    
+    return len(next(iter(n_gram_counts)))
+
+
+def build_successor_index(n_plus1_gram_counts):
+    """
+    Index the words observed after every n-gram
+    
+    Args:
+        n_plus1_gram_counts: Dictionary of counts of (n+1)-grams
+    
+    Returns:
+        A dictionary that maps every n-gram (tuple) to a list of tuples (next word, count of the (n+1)-gram) sorted by word
+    """
+    successor_index = {}
+    for n_plus1_gram, count in n_plus1_gram_counts.items():
+        successor_index.setdefault(n_plus1_gram[:-1], []).append((n_plus1_gram[-1], count))
+    
+    for successors in successor_index.values():
+        successors.sort()
+    
+    return successor_index
+
+
+def build_prefix_index(vocabulary):
+    """
+    Sort the words that can be suggested so that all the words sharing a prefix are a contiguous range
+    
+    Args:
+        vocabulary: List of words
+    
+    Returns:
+        Sorted list of the words of the vocabulary plus "<e>" and "<unk>"
+    """
+    return sorted(set(vocabulary + ["<e>", "<unk>"]))
+
+
+def prefix_range(sorted_words, prefix):
+    """
+    Find the range of the words that start with a prefix with two binary searches
+    
+    Args:
+        sorted_words: List of words sorted alphabetically
+        prefix: the first few letters of the words
+    
+    Returns:
+        Tuple (lo, hi) so that sorted_words[lo:hi] are the words starting with the prefix
+    """
+    if prefix == None or len(prefix) == 0:
+        return 0, len(sorted_words)
+    
+    # Every word starting with the prefix is lower than the prefix with its last character incremented
+    lo = bisect.bisect_left(sorted_words, prefix)
+    hi = bisect.bisect_left(sorted_words, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+    
+    return lo, hi
+
+
+def get_successors(previous_n_gram, n_plus1_gram_counts, successor_index=None, start_with=None, start_token='<s>'):
+    """
+    Get the words observed after an n-gram
+    
+    Args:
+        previous_n_gram: A sequence of words of length n
+        n_plus1_gram_counts: Dictionary of counts of (n+1)-grams, or a view of a trie (NGramTrieCounts)
+        successor_index: Output of build_successor_index for n_plus1_gram_counts (not needed for tries)
+        start_with: If not None, only the words starting with these letters are returned
+        start_token: padding token, which is never suggested
+    
+    Returns:
+        List of tuples (next word, count of the (n+1)-gram) sorted by word
+    """
+    if isinstance(n_plus1_gram_counts, NGramTrieCounts):
+        # A shorter context (sentence start) has no n-gram count, like in the successor index whose keys all have n words,
+        # so its successors in the trie (the ones of a lower order) must not be scored against the n-gram counts
+        if len(previous_n_gram) != n_plus1_gram_counts.n - 1:
+            return []
+
+        trie = n_plus1_gram_counts.trie
+        word_ids, counts = trie_successors(trie, previous_n_gram)
+        
+        # Word ids follow the alphabetical order, so the words under the prefix are a range of the sorted successor ids
+        lo_id, hi_id = prefix_range(trie["id_to_word"], start_with)
+        lo, hi = np.searchsorted(word_ids, [lo_id, hi_id])
+        successors = [(trie["id_to_word"][word_id], int(count)) for word_id, count in zip(word_ids[lo:hi], counts[lo:hi])]
+    else:
+        successors = successor_index.get(tuple(previous_n_gram), [])
+        if start_with != None and len(start_with) > 0:
+            lo = bisect.bisect_left(successors, start_with, key=lambda successor: successor[0])
+            hi = bisect.bisect_left(successors, start_with[:-1] + chr(ord(start_with[-1]) + 1), lo, key=lambda successor: successor[0])
+            successors = successors[lo:hi]
+    
+    return [(word, count) for word, count in successors if word != start_token]
+
+
+def first_candidate(n_plus1_gram_counts, vocabulary, start_with=None, prefix_index=None, start_token='<s>'):
+    """
+    Get the first word (alphabetically) that can be suggested, used when no observed word is left
+    
+    Args:
+        n_plus1_gram_counts: Dictionary of counts of (n+1)-grams, or a view of a trie (NGramTrieCounts)
+        vocabulary: List of words
+        start_with: If not None, specifies the first few letters of the word
+        prefix_index: Output of build_prefix_index(vocabulary); the vocabulary is scanned if it is None
+    
+    Returns:
+        A word, or None if no word starts with start_with
+    """
+    if isinstance(n_plus1_gram_counts, NGramTrieCounts):
+        prefix_index = n_plus1_gram_counts.trie["id_to_word"]
+    
+    if prefix_index is None:
+        candidates = [word for word in vocabulary + ["<e>", "<unk>"] if start_with == None or word.startswith(start_with)]
+        return min(candidates) if len(candidates) > 0 else None
+    
+    # Skipping the padding token, which sorts among the other words in the trie
+    lo, hi = prefix_range(prefix_index, start_with)
+    for word in prefix_index[lo:min(hi, lo + 2)]:
+        if word != start_token:
+            return word
+    
+    return None
+
+
+def suggest_from_successors(previous_n_gram, n_gram_counts, n_plus1_gram_counts, vocabulary, k=1.0, start_with=None, successor_index=None, prefix_index=None):
+    """
+    Get the most likely next word by only looking at the words observed after the previous n-gram
+    
+    With k-smoothing every unseen word has the same probability k / (count of the n-gram + k * vocabulary size),
+    which is always lower than the probability of any observed word, so the vocabulary is only looked at
+    when no observed word is left (e.g. after filtering by start_with). Ties are broken alphabetically.
+    
+    Args:
+        previous_n_gram: A sequence of words of length n
+        n_gram_counts: Dictionary of counts of n-grams
+        n_plus1_gram_counts: Dictionary of counts of (n+1)-grams, or a view of a trie (NGramTrieCounts)
+        vocabulary: List of words
+        k: positive constant, smoothing parameter
+        start_with: If not None, specifies the first few letters of the next word
+        successor_index: Output of build_successor_index for n_plus1_gram_counts (not needed for tries)
+        prefix_index: Output of build_prefix_index(vocabulary) (not needed for tries)
+    
+    Returns:
+        A tuple of 
+          - string of the most likely next word
+          - corresponding probability
+    """
+    previous_n_gram = tuple(previous_n_gram)
+    
+    # Same denominator as estimate_probability, shared by every candidate word
+    vocabulary_size = len(vocabulary) + 2
+    denominator = n_gram_counts.get(previous_n_gram, 0) + k * vocabulary_size
+    
+    # Keeping the observed word with the highest count (the first one alphabetically if there are ties)
+    suggestion = None
+    max_count = 0
+    for word, count in get_successors(previous_n_gram, n_plus1_gram_counts, successor_index, start_with):
+        if count > max_count:
+            suggestion, max_count = word, count
+    
+    # Falling back to the unseen words, which all share the same smoothed probability
+    if suggestion is None:
+        suggestion = first_candidate(n_plus1_gram_counts, vocabulary, start_with, prefix_index)
+    
+    max_prob = (max_count + k) / denominator if suggestion is not None else 0
+    if max_prob <= 0:
+        return None, 0
+    
+    return suggestion, max_prob
+
+
+def suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabulary, k=1.0, start_with=None, successor_index=None, prefix_index=None):
     """
     Get suggestion for the next word
     
@@ -304,6 +799,9 @@ def suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabula
         vocabulary: List of words
         k: positive constant, smoothing parameter
         start_with: If not None, specifies the first few letters of the next word
+        successor_index: If not None, output of build_successor_index to only score the observed next words
+                         (used automatically when the counts are views of a trie)
+        prefix_index: If not None, output of build_prefix_index to find the words starting with start_with by binary search
         
     Returns:
         A tuple of 
@@ -312,10 +810,14 @@ def suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabula
     """
     
     # Length of previous words
-    n = len(list(n_gram_counts.keys())[0]) 
+    n = n_gram_order(n_gram_counts)
     
     # From the words that the user already typed, getting the most recent 'n' words as the previous n-gram
     previous_n_gram = previous_tokens[-n:]
+    
+    # Only scoring the observed next words when they can be looked up directly
+    if successor_index is not None or isinstance(n_plus1_gram_counts, NGramTrieCounts):
+        return suggest_from_successors(previous_n_gram, n_gram_counts, n_plus1_gram_counts, vocabulary, k=k, start_with=start_with, successor_index=successor_index, prefix_index=prefix_index)
 
     # Estimating the probabilities that each word in the vocabulary is the next word
     probabilities = estimate_probabilities(previous_n_gram, n_gram_counts, n_plus1_gram_counts, vocabulary, k=k)
@@ -341,7 +843,7 @@ def suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabula
     return suggestion, max_prob
 
 
-def get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0, start_with=None):
+def get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0, start_with=None, successor_indexes=None, prefix_index=None):
     """
     Get suggestions from the input sequence
 
@@ -351,6 +853,9 @@ def get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0, star
         vocabulary: List of words
         k: positive constant, smoothing parameter
         start_with: If not None, specifies the first few letters of the next word
+        successor_indexes: If not None, list with the output of build_successor_index for every entry
+                           of n_gram_counts_list but the first one
+        prefix_index: If not None, output of build_prefix_index(vocabulary)
 
     Returns:
         A list of suggestions in the form of a tuple for each entry (suggestion, probability)
@@ -361,6 +866,1738 @@ def get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=1.0, star
         n_gram_counts = n_gram_counts_list[i] # getting n-gram counts of each model
         n_plus1_gram_counts = n_gram_counts_list[i+1] # getting n-gram plus 1 counts of each model
         
-        suggestion = suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabulary, k=k, start_with=start_with) # getting suggestion
+        successor_index = successor_indexes[i] if successor_indexes is not None else None
+        
+        suggestion = suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabulary, k=k, start_with=start_with, successor_index=successor_index, prefix_index=prefix_index) # getting suggestion
         suggestions.append(suggestion) # appending to suggestions
     return suggestions
+
+
+def stupid_backoff_suggestions(previous_tokens, n_gram_counts_list, start_with=None, alpha=0.4, num_suggestions=1, successor_indexes=None):
+    """
+    Get suggestions with stupid backoff: the highest order is queried first and a lower order is only used
+    (with a fixed discount alpha per order) when the context is unseen or has no matching word. Scores are
+    relative frequencies count(context + word) / count(context), never normalized over the vocabulary.
+    
+    Args:
+        previous_tokens: The sentence you input where each token is a word
+        n_gram_counts_list: List of dictionaries (or trie views) with n-gram counts of consecutive orders
+        start_with: If not None, specifies the first few letters of the next word
+        alpha: discount applied every time a lower order is used
+        num_suggestions: number of suggestions to return
+        successor_indexes: list with the output of build_successor_index for every entry of n_gram_counts_list
+                           but the first one, built once before querying (required unless the counts are trie views)
+    
+    Returns:
+        A list of at most num_suggestions tuples (suggestion, score) sorted from the best one
+    """
+    # Building the successor indexes scans the whole count tables, so it is never done per query
+    if successor_indexes is None and not all(isinstance(counts, NGramTrieCounts) for counts in n_gram_counts_list[1:]):
+        raise ValueError("successor_indexes must be given (see build_successor_index) when the counts are not trie views")
+    
+    discount = 1.0
+    for i in reversed(range(len(n_gram_counts_list) - 1)):
+        n_gram_counts = n_gram_counts_list[i]
+        n_plus1_gram_counts = n_gram_counts_list[i+1]
+        
+        n = n_gram_order(n_gram_counts)
+        previous_n_gram = tuple(previous_tokens[-n:])
+        context_count = n_gram_counts.get(previous_n_gram, 0)
+        
+        if context_count > 0:
+            successor_index = successor_indexes[i] if successor_indexes is not None else None
+            successors = get_successors(previous_n_gram, n_plus1_gram_counts, successor_index, start_with)
+            if len(successors) > 0:
+                # Highest counts first (alphabetically for ties)
+                successors.sort(key=lambda successor: -successor[1])
+                return [(word, discount * count / context_count) for word, count in successors[:num_suggestions]]
+        
+        # Backing off to the next lower order
+        discount *= alpha
+    
+    return []
+
+
+def build_vocabulary_index(vocabulary, start_token='<s>', end_token='<e>', unknown_token="<unk>"):
+    """
+    Map every word of the vocabulary (plus the special tokens) to an integer id
+    
+    Args:
+        vocabulary: List of words
+        start_token, end_token, unknown_token: special tokens added to the vocabulary
+    
+    Returns:
+        Tuple of
+        - list of words sorted alphabetically, where the position of each word is its id
+        - dictionary that maps each word to its id
+    """
+    
+    # Sorting the words so that all the words sharing a prefix get a contiguous range of ids
+    id_to_word = sorted(set(vocabulary) | {start_token, end_token, unknown_token})
+    word_to_id = {word: i for i, word in enumerate(id_to_word)}
+    
+    return id_to_word, word_to_id
+
+
+def encode_sentence(sentence, word_to_id, unknown_token="<unk>"):
+    """
+    Convert a list of tokens into an array of word ids
+    
+    Args:
+        sentence: List of tokens
+        word_to_id: dictionary that maps each word to its id
+        unknown_token: token whose id is used for words out of the vocabulary
+    
+    Returns:
+        NumPy int32 array of word ids
+    """
+    unknown_id = word_to_id[unknown_token]
+    
+    return np.array([word_to_id.get(token, unknown_id) for token in sentence], dtype=np.int32)
+
+
+def count_encoded_n_grams(encoded_data, n, start_id, end_id):
+    """
+    Count all n-grams in the encoded data
+    
+    Args:
+        encoded_data: List of arrays of word ids
+        n: number of tokens in a sequence for the n-gram model
+        start_id, end_id: ids of the start and end tokens
+    
+    Returns:
+        Tuple of
+        - NumPy array of shape (number of distinct n-grams, n) with the n-grams sorted lexicographically
+        - NumPy array with the count of each n-gram
+    """
+    if len(encoded_data) == 0:
+        return np.zeros((0, n), dtype=np.int32), np.zeros(0, dtype=np.int64)
+    
+    # Padding every sentence the same way count_n_grams does (n start tokens and one end token) and joining them
+    padded = [np.concatenate((np.full(n, start_id, dtype=np.int32), sentence, [end_id])).astype(np.int32) for sentence in encoded_data]
+    lengths = np.array([len(sentence) for sentence in padded])
+    joined = np.concatenate(padded)
+    
+    # Every window of n tokens of the joined data, keeping only the windows that don't cross a sentence boundary
+    windows = np.lib.stride_tricks.sliding_window_view(joined, n)
+    sentence_starts = np.cumsum(lengths) - lengths
+    window_sentence = np.repeat(np.arange(len(padded)), lengths)[:len(windows)]
+    valid = np.arange(len(windows)) - sentence_starts[window_sentence] <= lengths[window_sentence] - n
+    
+    n_grams, counts = np.unique(windows[valid], axis=0, return_counts=True)
+    
+    return n_grams, counts.astype(np.int64)
+
+
+def n_gram_keys(n_grams, parent_level_grams, vocabulary_size):
+    """
+    Compute the trie keys of sorted n-grams: parent node index * vocabulary size + last word id
+    
+    Args:
+        n_grams: NumPy array of shape (number of n-grams, n) sorted lexicographically
+        parent_level_grams: NumPy array of shape (number of (n-1)-grams, n-1) sorted lexicographically
+        vocabulary_size: number of word ids
+    
+    Returns:
+        NumPy int64 array of keys, sorted in increasing order
+    """
+    n = n_grams.shape[1]
+    if n == 1:
+        return n_grams[:, 0].astype(np.int64)
+    
+    # Sorting the parents together with the prefixes of the n-grams: every prefix lands right after its parent
+    prefixes = n_grams[:, :-1]
+    merged = np.concatenate((parent_level_grams, prefixes))
+    tags = np.concatenate((np.zeros(len(parent_level_grams), dtype=np.int8), np.ones(len(prefixes), dtype=np.int8)))
+    order = np.lexsort((tags,) + tuple(merged[:, i] for i in reversed(range(n - 1))))
+    
+    # The parent index of each prefix is the number of parents sorted before it, minus one
+    parents_before = np.cumsum(tags[order] == 0) - 1
+    parent_index = np.empty(len(prefixes), dtype=np.int64)
+    is_prefix = tags[order] == 1
+    parent_index[order[is_prefix] - len(parent_level_grams)] = parents_before[is_prefix]
+    
+    return parent_index * vocabulary_size + n_grams[:, -1]
+
+
+def build_ngram_trie(data, vocabulary, max_order, start_token='<s>', end_token='<e>', unknown_token="<unk>"):
+    """
+    Count the n-grams of every order from 1 to max_order and store them in a single trie made of sorted arrays
+    
+    Every node of order n is identified by its position in the sorted key array of that order, and its key is
+    parent node index * vocabulary size + word id, so the prefixes are shared between all the orders and
+    the children of a node are a contiguous range of the next order. The count of a node of order n is the
+    same count that count_n_grams(data, n) returns for that n-gram.
+    
+    Args:
+        data: List of lists of tokens
+        vocabulary: List of words
+        max_order: highest n-gram order to be stored
+    
+    Returns:
+        A dictionary with
+        - "id_to_word" / "word_to_id": the vocabulary index (see build_vocabulary_index)
+        - "keys": list with the sorted int64 keys of each order (keys[n-1] for order n)
+        - "counts": list with the int64 counts of each order, aligned with the keys
+    """
+    id_to_word, word_to_id = build_vocabulary_index(vocabulary, start_token, end_token, unknown_token)
+    encoded_data = [encode_sentence(sentence, word_to_id, unknown_token) for sentence in data]
+    
+    return build_ngram_trie_encoded(encoded_data, id_to_word, max_order, start_token, end_token)
+
+
+def build_ngram_trie_encoded(encoded_data, id_to_word, max_order, start_token='<s>', end_token='<e>'):
+    """
+    Same as build_ngram_trie for data already encoded with the ids of id_to_word (e.g. read from the corpus cache)
+    
+    Args:
+        encoded_data: List of arrays of word ids
+        id_to_word: list of words sorted alphabetically, where the position of each word is its id
+        max_order: highest n-gram order to be stored
+    
+    Returns:
+        n-gram trie (see build_ngram_trie)
+    """
+    word_to_id = {word: i for i, word in enumerate(id_to_word)}
+    
+    keys = []
+    counts = []
+    parent_level_grams = np.zeros((1, 0), dtype=np.int32)
+    for n in range(1, max_order + 1):
+        n_grams, n_counts = count_encoded_n_grams(encoded_data, n, word_to_id[start_token], word_to_id[end_token])
+        keys.append(n_gram_keys(n_grams, parent_level_grams, len(id_to_word)))
+        counts.append(n_counts)
+        parent_level_grams = n_grams
+    
+    return {"id_to_word": id_to_word, "word_to_id": word_to_id, "keys": keys, "counts": counts}
+
+
+def trie_find(trie, n_gram):
+    """
+    Find the node of an n-gram in the trie
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        n_gram: sequence of words or word ids
+    
+    Returns:
+        Index of the node in its order, or -1 if the n-gram was never seen
+    """
+    vocabulary_size = len(trie["id_to_word"])
+    word_to_id = trie["word_to_id"]
+    if len(n_gram) > len(trie["keys"]):
+        return -1
+    
+    node = 0
+    for level, word in enumerate(n_gram):
+        word_id = word if isinstance(word, (int, np.integer)) else word_to_id.get(word, -1)
+        if word_id < 0:
+            return -1
+        
+        # Binary search of the child (node, word) in the sorted keys of the next order
+        key = node * vocabulary_size + word_id
+        keys = trie["keys"][level]
+        node = int(np.searchsorted(keys, key))
+        if node == len(keys) or keys[node] != key:
+            return -1
+    
+    return node
+
+
+def trie_count(trie, n_gram):
+    """
+    Get the count of an n-gram from the trie (0 if it was never seen)
+    """
+    if len(n_gram) == 0:
+        return 0
+    
+    node = trie_find(trie, n_gram)
+    
+    return 0 if node < 0 else int(trie["counts"][len(n_gram) - 1][node])
+
+
+def trie_successors(trie, context):
+    """
+    Get the words observed after a context
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        context: sequence of words or word ids (its length must be lower than the highest order)
+    
+    Returns:
+        Tuple of NumPy arrays with the ids of the following words (sorted) and the counts of context + word
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    if len(context) >= len(trie["keys"]):
+        return empty, empty
+    
+    node = trie_find(trie, context) if len(context) > 0 else 0
+    if node < 0:
+        return empty, empty
+    
+    # The children of a node are the contiguous range of keys between node * V and (node + 1) * V
+    vocabulary_size = len(trie["id_to_word"])
+    keys = trie["keys"][len(context)]
+    lo, hi = np.searchsorted(keys, [node * vocabulary_size, (node + 1) * vocabulary_size])
+    
+    return keys[lo:hi] - node * vocabulary_size, trie["counts"][len(context)][lo:hi]
+
+
+class NGramTrieCounts(Mapping):
+    """
+    Read-only view of one order of the trie that behaves like the dictionary returned by count_n_grams,
+    so it can be passed directly to estimate_probability, suggest_a_word and get_suggestions
+    """
+    
+    def __init__(self, trie, n):
+        self.trie = trie
+        self.n = n
+        self.token = uuid.uuid4().hex
+    
+    def cache_key(self):
+        # The arrays of a trie are never updated in place
+        return (self.token,)
+    
+    def __getitem__(self, n_gram):
+        if not isinstance(n_gram, tuple) or len(n_gram) != self.n:
+            raise KeyError(n_gram)
+        node = trie_find(self.trie, n_gram)
+        if node < 0:
+            raise KeyError(n_gram)
+        return int(self.trie["counts"][self.n - 1][node])
+    
+    def __iter__(self):
+        # Walking the keys of this order back up to the root to rebuild each n-gram of words
+        vocabulary_size = len(self.trie["id_to_word"])
+        id_to_word = self.trie["id_to_word"]
+        for node in range(len(self.trie["keys"][self.n - 1])):
+            n_gram = []
+            for level in reversed(range(self.n)):
+                node, word_id = divmod(int(self.trie["keys"][level][node]), vocabulary_size)
+                n_gram.append(id_to_word[word_id])
+            yield tuple(reversed(n_gram))
+    
+    def __len__(self):
+        return len(self.trie["keys"][self.n - 1])
+
+
+def trie_vocabulary(trie, special_tokens=('<s>', '<e>', "<unk>")):
+    """
+    Get the vocabulary list (without the special tokens) of a trie, e.g. after loading it from disk
+    """
+    return [word for word in trie["id_to_word"] if word not in special_tokens]
+
+
+def trie_vocabulary_size(trie, start_token='<s>'):
+    """
+    Get the vocabulary size used by estimate_probabilities (every word of the trie but the start token)
+    """
+    return len(trie["id_to_word"]) - (start_token in trie["word_to_id"])
+
+
+def trie_log_probs(trie, n, k=1.0, start_token='<s>'):
+    """
+    Compute the k-smoothed log10 probability of every n-gram stored in the trie (same formula as estimate_probability)
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        n: order of the n-grams
+        k: positive constant, smoothing parameter
+    
+    Returns:
+        NumPy float64 array aligned with trie["keys"][n-1]
+    """
+    
+    vocabulary_size = trie_vocabulary_size(trie, start_token)
+    counts = np.asarray(trie["counts"][n - 1])
+    
+    # The parent of every node is its key divided by the number of word ids (the root for unigrams)
+    if n == 1:
+        context_counts = np.full(len(counts), counts.sum())
+    else:
+        context_counts = np.asarray(trie["counts"][n - 2])[np.asarray(trie["keys"][n - 1]) // len(trie["id_to_word"])]
+    
+    return np.log10((counts + k) / (context_counts + k * vocabulary_size))
+
+
+def save_ngram_trie(trie, path, k=None, quantization_bits=8):
+    """
+    Save a trie in a binary file that can be memory-mapped by load_ngram_trie
+    
+    The file starts with b"NGRAMTRIE1", the length of a JSON header (8 bytes, little endian) and the header itself,
+    which holds the vocabulary and the dtype, shape and offset of every array. The arrays (sorted keys, counts and the
+    optional quantized log-probabilities) follow, aligned to 64 bytes.
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        path: path of the output file
+        k: if not None, a column of k-smoothed log-probabilities is added, quantized to quantization_bits (8 or 16) bits
+    """
+    arrays = {}
+    header = {"id_to_word": trie["id_to_word"], "orders": len(trie["keys"]), "arrays": {}, "quantization": {}}
+    for level in range(len(trie["keys"])):
+        arrays["keys_%d" % (level + 1)] = np.ascontiguousarray(trie["keys"][level], dtype=np.int64)
+        arrays["counts_%d" % (level + 1)] = np.ascontiguousarray(trie["counts"][level], dtype=np.int64)
+        
+        if k is not None:
+            # Linear quantization of the log-probabilities between their minimum and maximum values
+            log_probs = trie_log_probs(trie, level + 1, k)
+            low = float(log_probs.min()) if len(log_probs) > 0 else 0.0
+            high = float(log_probs.max()) if len(log_probs) > 0 else 0.0
+            levels = 2 ** quantization_bits - 1
+            scale = (high - low) / levels if high > low else 1.0
+            dtype = np.uint8 if quantization_bits <= 8 else np.uint16
+            arrays["log_probs_%d" % (level + 1)] = np.round((log_probs - low) / scale).astype(dtype)
+            header["quantization"][str(level + 1)] = {"k": k, "low": low, "scale": scale}
+    
+    # Computing the offset of every array after the header
+    offset = 0
+    for name, array in arrays.items():
+        offset = (offset + 63) // 64 * 64
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += array.nbytes
+    
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = (10 + 8 + len(header_bytes) + 63) // 64 * 64
+    
+    with open(path, "wb") as f:
+        f.write(b"NGRAMTRIE1")
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.write(b"\0" * (data_start + header["arrays"][name]["offset"] - f.tell()))
+            f.write(array.tobytes())
+
+
+def load_ngram_trie(path):
+    """
+    Load a trie saved by save_ngram_trie, memory-mapping its arrays (nothing is read until it is used,
+    and processes loading the same file share the same pages)
+    
+    Args:
+        path: path of the file
+    
+    Returns:
+        n-gram trie (see build_ngram_trie), plus "log_probs" (dequantized on access with dequantize_log_probs)
+        and "quantization" when the file has log-probabilities
+    """
+    with open(path, "rb") as f:
+        if f.read(10) != b"NGRAMTRIE1":
+            raise ValueError("%s is not an n-gram trie file" % path)
+        header_length = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_length).decode("utf-8"))
+    data_start = (10 + 8 + header_length + 63) // 64 * 64
+    
+    def mapped(name):
+        info = header["arrays"][name]
+        if np.prod(info["shape"]) == 0:
+            return np.zeros(info["shape"], dtype=info["dtype"])
+        return np.memmap(path, dtype=info["dtype"], mode="r", offset=data_start + info["offset"], shape=tuple(info["shape"]))
+    
+    orders = range(1, header["orders"] + 1)
+    id_to_word = header["id_to_word"]
+    trie = {
+        "id_to_word": id_to_word,
+        "word_to_id": {word: i for i, word in enumerate(id_to_word)},
+        "keys": [mapped("keys_%d" % n) for n in orders],
+        "counts": [mapped("counts_%d" % n) for n in orders],
+    }
+    if len(header["quantization"]) > 0:
+        trie["log_probs"] = [mapped("log_probs_%d" % n) for n in orders]
+        trie["quantization"] = [header["quantization"][str(n)] for n in orders]
+    
+    return trie
+
+
+def dequantize_log_probs(trie, n):
+    """
+    Get the log10 probabilities of the n-grams of a trie loaded with a quantized log-probability column
+    """
+    quantization = trie["quantization"][n - 1]
+    
+    return trie["log_probs"][n - 1] * quantization["scale"] + quantization["low"]
+
+
+def export_arpa(trie, path, k=1.0):
+    """
+    Export the n-grams of a trie with their k-smoothed log10 probabilities in the ARPA text format
+    (no backoff weights are written since the model uses k-smoothing instead of backoff)
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        path: path of the output file
+        k: positive constant, smoothing parameter
+    """
+    orders = len(trie["keys"])
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\\data\\\n")
+        for n in range(1, orders + 1):
+            f.write("ngram %d=%d\n" % (n, len(trie["keys"][n - 1])))
+        
+        for n in range(1, orders + 1):
+            f.write("\n\\%d-grams:\n" % n)
+            log_probs = trie_log_probs(trie, n, k)
+            for n_gram, log_prob in zip(NGramTrieCounts(trie, n), log_probs):
+                f.write("%.6f\t%s\n" % (log_prob, " ".join(n_gram)))
+        
+        f.write("\n\\end\\\n")
+
+
+def import_arpa(path):
+    """
+    Read an ARPA language model file
+    
+    Args:
+        path: path of the ARPA file
+    
+    Returns:
+        List with one dictionary per order that maps each n-gram (tuple) to a tuple (log10 probability, backoff weight)
+    """
+    n_gram_log_probs = []
+    n = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if len(line) == 0 or line.startswith("ngram ") or line in ("\\data\\", "\\end\\"):
+                continue
+            
+            # Starting the section of the next order
+            if line.startswith("\\") and line.endswith("-grams:"):
+                n = int(line[1:-len("-grams:")])
+                while len(n_gram_log_probs) < n:
+                    n_gram_log_probs.append({})
+                continue
+            
+            fields = line.split()
+            backoff = float(fields[n + 1]) if len(fields) > n + 1 else 0.0
+            n_gram_log_probs[n - 1][tuple(fields[1:n + 1])] = (float(fields[0]), backoff)
+    
+    return n_gram_log_probs
+
+
+def trie_find_many(trie, n_grams):
+    """
+    Find the nodes of many n-grams of the same order at once
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        n_grams: NumPy array of shape (number of n-grams, n) with word ids
+    
+    Returns:
+        NumPy int64 array with the index of every node in its order, or -1 for the n-grams never seen
+    """
+    vocabulary_size = len(trie["id_to_word"])
+    nodes = np.zeros(len(n_grams), dtype=np.int64)
+    found = np.ones(len(n_grams), dtype=bool)
+    
+    # Going down one level at a time for all the n-grams together
+    for level in range(n_grams.shape[1]):
+        keys = trie["keys"][level]
+        if len(keys) == 0:
+            return np.full(len(n_grams), -1, dtype=np.int64)
+        wanted = nodes * vocabulary_size + n_grams[:, level]
+        positions = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+        found &= keys[positions] == wanted
+        nodes = np.where(found, positions, 0)
+    
+    return np.where(found, nodes, -1)
+
+
+def trie_count_many(trie, n_grams):
+    """
+    Get the counts of many n-grams of the same order at once (0 for the n-grams never seen)
+    """
+    if n_grams.shape[1] == 0:
+        return np.zeros(len(n_grams), dtype=np.int64)
+    
+    nodes = trie_find_many(trie, n_grams)
+    counts = np.asarray(trie["counts"][n_grams.shape[1] - 1])
+    
+    return np.where(nodes >= 0, counts[np.maximum(nodes, 0)] if len(counts) > 0 else 0, 0)
+
+
+def encode_windows(data, word_to_id, n, start_token='<s>', end_token='<e>', unknown_token="<unk>"):
+    """
+    Get every window of n+1 word ids of the sentences padded with n start tokens and one end token
+    
+    Args:
+        data: List of lists of tokens
+        word_to_id: dictionary that maps each word to its id
+        n: number of words of the context
+    
+    Returns:
+        Tuple of
+        - NumPy array of shape (number of windows, n+1) with word ids
+        - NumPy array with the padded length of every sentence
+    """
+    start_id = word_to_id[start_token]
+    padded = [np.concatenate(([start_id] * n, encode_sentence(sentence, word_to_id, unknown_token), [word_to_id[end_token]])).astype(np.int64) for sentence in data]
+    windows = [np.lib.stride_tricks.sliding_window_view(sentence, n + 1) for sentence in padded]
+    
+    return np.concatenate(windows) if len(windows) > 0 else np.zeros((0, n + 1), dtype=np.int64), np.array([len(sentence) for sentence in padded])
+
+
+def evaluate_perplexity(test_data, trie, n, k_values=(1.0,)):
+    """
+    Compute the perplexity of the test data for several values of k in one pass over the counts
+    
+    Each sentence is padded with n start tokens and one end token, and only the words that are predicted
+    (the words of the sentence and the end token, one per window) are counted: the start tokens are never
+    scored. The corpus perplexity is exp(-sum of all log-probabilities / number of scored tokens).
+    
+    Args:
+        test_data: List of lists of tokens (with the rare words already replaced by "<unk>")
+        trie: n-gram trie (see build_ngram_trie) with orders up to n+1
+        n: number of words of the context
+        k_values: sequence of smoothing parameters to be evaluated
+    
+    Returns:
+        NumPy array with the perplexity for every value of k_values
+    """
+    windows, _ = encode_windows(test_data, trie["word_to_id"], n)
+    
+    # Looking up all the context and (n+1)-gram counts in bulk
+    context_counts = trie_count_many(trie, windows[:, :-1])
+    n_plus1_counts = trie_count_many(trie, windows)
+    
+    # One row of log-probabilities per value of k
+    k_values = np.asarray(k_values, dtype=np.float64)[:, None]
+    vocabulary_size = trie_vocabulary_size(trie)
+    log_probs = np.log(n_plus1_counts + k_values) - np.log(context_counts + k_values * vocabulary_size)
+    
+    # One scored token per window, i.e. len(sentence) + 1 per sentence
+    log_perplexity = -log_probs.sum(axis=1) / max(len(windows), 1)
+    
+    return np.exp(log_perplexity)
+
+
+def trie_n_grams(trie, n):
+    """
+    Rebuild the word ids of every n-gram stored in the trie, following the parents from the nodes up to the root
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        n: order of the n-grams
+    
+    Returns:
+        NumPy array of shape (number of n-grams, n) with word ids, in the order of the nodes
+    """
+    vocabulary_size = len(trie["id_to_word"])
+    n_grams = np.zeros((len(trie["keys"][n - 1]), n), dtype=np.int64)
+    nodes = np.arange(len(n_grams))
+    for level in reversed(range(n)):
+        keys = np.asarray(trie["keys"][level])[nodes]
+        n_grams[:, level] = keys % vocabulary_size
+        nodes = keys // vocabulary_size
+    
+    return n_grams
+
+
+def build_suffix_links(trie, n):
+    """
+    Link every node of order n+1 (context + word) to the node of order n of its last n words (the next context)
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        n: number of words of the context
+    
+    Returns:
+        NumPy int64 array aligned with the nodes of order n+1, with node indices of order n (-1 if not found)
+    """
+    return trie_find_many(trie, trie_n_grams(trie, n + 1)[:, 1:])
+
+
+def trie_successors_many(trie, n, context_nodes):
+    """
+    Get the observed successors of many contexts of the same order at once
+    
+    Args:
+        trie: n-gram trie (see build_ngram_trie)
+        n: number of words of the contexts
+        context_nodes: NumPy array with node indices of order n (-1 for unseen contexts, which have no successors)
+    
+    Returns:
+        Tuple of NumPy arrays, one entry per successor
+        - index of the context it belongs to
+        - word id
+        - node index of context + word (order n+1)
+        - count of context + word
+    """
+    vocabulary_size = len(trie["id_to_word"])
+    keys = trie["keys"][n]
+    context_nodes = np.asarray(context_nodes, dtype=np.int64)
+    
+    # The children of every context are a contiguous range of the keys of order n+1
+    lo = np.searchsorted(keys, context_nodes * vocabulary_size)
+    hi = np.searchsorted(keys, (context_nodes + 1) * vocabulary_size)
+    sizes = np.where(context_nodes >= 0, hi - lo, 0)
+    
+    owners = np.repeat(np.arange(len(context_nodes)), sizes)
+    children = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes) + np.repeat(lo, sizes)
+    word_ids = np.asarray(keys)[children] % vocabulary_size
+    
+    return owners, word_ids, children, np.asarray(trie["counts"][n])[children]
+
+
+def score_successors_many(trie, n, context_nodes, k=1.0, start_token='<s>'):
+    """
+    Score the observed successors of many contexts in one batch with k-smoothed log-probabilities
+    
+    Returns:
+        Tuple of NumPy arrays (context index, word id, node of context + word, natural log-probability), one entry per successor
+    """
+    owners, word_ids, children, counts = trie_successors_many(trie, n, context_nodes)
+    
+    # Never generating the padding token
+    keep = word_ids != trie["word_to_id"][start_token]
+    owners, word_ids, children, counts = owners[keep], word_ids[keep], children[keep], counts[keep]
+    
+    # Context counts come from the parent order (the root count is not needed since n >= 1)
+    context_counts = np.asarray(trie["counts"][n - 1])[np.asarray(context_nodes)[owners]] if n > 0 else 0
+    log_probs = np.log(counts + k) - np.log(context_counts + k * trie_vocabulary_size(trie, start_token))
+    
+    return owners, word_ids, children, log_probs
+
+
+def context_node(trie, previous_tokens, n, start_token='<s>'):
+    """
+    Get the node of the last n tokens (padded with start tokens if needed), or -1 if this context was never seen
+    """
+    context = [start_token] * max(0, n - len(previous_tokens)) + list(previous_tokens[-n:] if n > 0 else [])
+    
+    return trie_find(trie, context)
+
+
+def next_context_nodes(trie, n, children, sequences, suffix_links):
+    """
+    Move the context state of every sequence after appending a word: the suffix link of the context + word node
+    gives the new context directly; the tokens are only looked up again for unseen contexts
+    """
+    nodes = np.where(children >= 0, suffix_links[np.maximum(children, 0)], -1)
+    for i in np.flatnonzero(nodes < 0):
+        nodes[i] = context_node(trie, sequences[i], n)
+    
+    return nodes
+
+
+def get_suffix_links(trie, n):
+    """
+    Get the suffix links of order n+1, computing them only once per trie
+    """
+    cache = trie.setdefault("suffix_links", {})
+    if n not in cache:
+        cache[n] = build_suffix_links(trie, n)
+    
+    return cache[n]
+
+
+def beam_search(previous_tokens, trie, n, k=1.0, beam_width=5, max_length=20, end_token='<e>'):
+    """
+    Generate the most likely continuations of the input sequence with beam search over one model order
+    
+    Every step expands all the beams together with one batched scoring call, carrying the node of the current
+    context from step to step. Only the observed successors are expanded (unseen words all share the lowest
+    smoothed probability), so a beam whose context was never seen is finished as it is.
+    
+    Args:
+        previous_tokens: The sentence you input where each token is a word
+        trie: n-gram trie (see build_ngram_trie) with orders up to n+1
+        n: number of words of the context
+        k: positive constant, smoothing parameter
+        beam_width: number of continuations kept at every step
+        max_length: maximum number of generated words
+    
+    Returns:
+        List of at most beam_width tuples (generated tokens, log-probability) sorted from the most likely one
+    """
+    suffix_links = get_suffix_links(trie, n)
+    end_id = trie["word_to_id"][end_token]
+    
+    beams = [[]]
+    scores = np.zeros(1)
+    nodes = np.array([context_node(trie, previous_tokens, n)])
+    finished = []
+    
+    for step in range(max_length):
+        owners, word_ids, children, log_probs = score_successors_many(trie, n, nodes, k)
+        
+        # Beams without any successor cannot be expanded any further
+        expanded = np.zeros(len(beams), dtype=bool)
+        expanded[owners] = True
+        finished += [(beams[i], float(scores[i])) for i in np.flatnonzero(~expanded)]
+        
+        # Keeping the best beam_width expansions over all the beams
+        candidate_scores = scores[owners] + log_probs
+        best = np.argsort(-candidate_scores, kind="stable")[:beam_width]
+        
+        # Expansions ending the sentence are finished, the others become the beams of the next step
+        ending = word_ids[best] == end_id
+        finished += [(beams[owners[i]] + [end_token], float(candidate_scores[i])) for i in best[ending]]
+        best = best[~ending]
+        if len(best) == 0:
+            beams = []
+            break
+        
+        beams = [beams[owners[i]] + [trie["id_to_word"][word_ids[i]]] for i in best]
+        scores = candidate_scores[best]
+        nodes = next_context_nodes(trie, n, children[best], [list(previous_tokens) + beam for beam in beams], suffix_links)
+    
+    finished += [(beam, float(score)) for beam, score in zip(beams, scores)]
+    finished.sort(key=lambda beam: -beam[1])
+    
+    return finished[:beam_width]
+
+
+def sample_continuations(previous_tokens, trie, n, k=1.0, num_samples=5, top_k=None, top_p=None, max_length=20, seed=None, end_token='<e>'):
+    """
+    Sample continuations of the input sequence, restricting every step to the top_k words and/or the smallest
+    set of words whose probability adds up to top_p (only observed successors are sampled)
+    
+    All the samples are expanded together with one batched scoring call per step, carrying the node of their context.
+    
+    Args:
+        previous_tokens: The sentence you input where each token is a word
+        trie: n-gram trie (see build_ngram_trie) with orders up to n+1
+        n: number of words of the context
+        k: positive constant, smoothing parameter
+        num_samples: number of continuations to generate
+        top_k: if not None, number of most likely words kept at every step
+        top_p: if not None, cumulative probability kept at every step (nucleus sampling)
+        max_length: maximum number of generated words
+        seed: seed of the random generator
+    
+    Returns:
+        List of num_samples lists of generated tokens
+    """
+    rng = np.random.default_rng(seed)
+    suffix_links = get_suffix_links(trie, n)
+    end_id = trie["word_to_id"][end_token]
+    
+    samples = [[] for i in range(num_samples)]
+    active = np.arange(num_samples)
+    nodes = np.full(num_samples, context_node(trie, previous_tokens, n))
+    
+    for step in range(max_length):
+        owners, word_ids, children, log_probs = score_successors_many(trie, n, nodes, k)
+        
+        chosen = np.full(len(active), -1)
+        for i in range(len(active)):
+            # Successors of sample i sorted from the most likely one (owners are sorted, so they are a contiguous range)
+            lo, hi = np.searchsorted(owners, [i, i + 1])
+            if lo == hi:
+                continue
+            candidates = lo + np.argsort(-log_probs[lo:hi], kind="stable")
+            probs = np.exp(log_probs[candidates])
+            probs /= probs.sum()
+            
+            if top_k is not None:
+                candidates, probs = candidates[:top_k], probs[:top_k]
+            if top_p is not None:
+                keep = np.searchsorted(np.cumsum(probs), top_p * probs.sum()) + 1
+                candidates, probs = candidates[:keep], probs[:keep]
+            
+            chosen[i] = rng.choice(candidates, p=probs / probs.sum())
+        
+        # Samples without successors or ending the sentence are done
+        for i, j in enumerate(chosen):
+            if j >= 0:
+                samples[active[i]].append(trie["id_to_word"][word_ids[j]])
+        going = (chosen >= 0) & (word_ids[np.maximum(chosen, 0)] != end_id) if len(word_ids) > 0 else np.zeros(len(active), dtype=bool)
+        if not going.any():
+            break
+        
+        active, chosen = active[going], chosen[going]
+        nodes = next_context_nodes(trie, n, children[chosen], [list(previous_tokens) + samples[i] for i in active], suffix_links)
+    
+    return samples
+
+
+def create_count_min_sketch(n, memory_bytes, depth=4, conservative=True, heavy_capacity=100000, heavy_threshold=10, seed=0):
+    """
+    Create an approximate n-gram count store with a fixed memory budget
+    
+    The counts are kept in a count-min sketch (depth rows of uint32 counters) and the n-grams whose estimated count
+    reaches heavy_threshold are counted exactly from then on in a heavy-hitter table of at most heavy_capacity entries.
+    
+    Args:
+        n: number of tokens of the n-grams to be counted
+        memory_bytes: memory budget of the sketch
+        depth: number of hash functions (rows)
+        conservative: if True, only the smallest counters of an n-gram are incremented (conservative update)
+        heavy_capacity: maximum number of n-grams with exact counts
+        heavy_threshold: estimated count from which an n-gram gets an exact count
+        seed: seed of the hash functions
+    
+    Returns:
+        A dictionary with the sketch table, the hash parameters and the heavy-hitter table
+    """
+    width = max(1, memory_bytes // (depth * 4))
+    rng = np.random.default_rng(seed)
+    
+    return {
+        "n": n,
+        "table": np.zeros((depth, width), dtype=np.uint32),
+        "hash_a": rng.integers(1, 2**31 - 1, size=depth, dtype=np.int64),
+        "hash_b": rng.integers(0, 2**31 - 1, size=depth, dtype=np.int64),
+        "conservative": conservative,
+        "heavy": {}, # n-gram -> (exact count since it was promoted, sketch estimate when it was promoted)
+        "heavy_capacity": heavy_capacity,
+        "heavy_threshold": heavy_threshold,
+        "min_count": 0,
+    }
+
+
+def sketch_columns(sketch, n_grams):
+    """
+    Hash n-grams into one column per row of the sketch
+    
+    Args:
+        sketch: approximate count store (see create_count_min_sketch)
+        n_grams: List of tuples of words
+    
+    Returns:
+        NumPy array of shape (number of n-grams, depth) with column indices
+    """
+    # CRC32 gives the same value in every process (unlike hash()), so a sketch can be saved and merged
+    fingerprints = np.array([zlib.crc32("\x1f".join(n_gram).encode("utf-8")) for n_gram in n_grams], dtype=np.int64)
+    columns = (fingerprints[:, None] * sketch["hash_a"] + sketch["hash_b"]) % (2**31 - 1)
+    
+    return columns % sketch["table"].shape[1]
+
+
+def count_n_grams_approximate(data, sketch, start_token='<s>', end_token='<e>'):
+    """
+    Count all n-grams in the data into an approximate count store (same padding as count_n_grams)
+    
+    Args:
+        data: List (or any iterable) of lists of tokens
+        sketch: approximate count store (see create_count_min_sketch), updated in place
+    
+    Returns:
+        The updated sketch
+    """
+    n = sketch["n"]
+    table = sketch["table"]
+    rows = np.arange(table.shape[0])
+    heavy = sketch["heavy"]
+    
+    for sentence in data:
+        sentence = tuple([start_token] * n + list(sentence) + [end_token])
+        n_grams = [sentence[i:i+n] for i in range(len(sentence) - n + 1)]
+        columns = sketch_columns(sketch, n_grams)
+        
+        for n_gram, n_gram_columns in zip(n_grams, columns):
+            counters = table[rows, n_gram_columns]
+            if sketch["conservative"]:
+                # Conservative update: raising only the counters that are below the new estimate
+                estimate = int(counters.min()) + 1
+                table[rows, n_gram_columns] = np.maximum(counters, estimate)
+            else:
+                table[rows, n_gram_columns] = counters + 1
+                estimate = int(counters.min()) + 1
+            
+            # Exact counting for the heavy hitters
+            if n_gram in heavy:
+                count, offset = heavy[n_gram]
+                heavy[n_gram] = (count + 1, offset)
+            elif estimate >= sketch["heavy_threshold"]:
+                heavy[n_gram] = (1, estimate - 1)
+                if len(heavy) > sketch["heavy_capacity"]:
+                    heavy = evict_heavy_hitters(sketch)
+    
+    return sketch
+
+
+def evict_heavy_hitters(sketch):
+    """
+    Keep only the most frequent half of the heavy-hitter table (the evicted n-grams fall back to the sketch estimate)
+    """
+    heavy = sketch["heavy"]
+    ranked = sorted(heavy.items(), key=lambda item: -(item[1][0] + item[1][1]))
+    sketch["heavy"] = dict(ranked[:max(1, sketch["heavy_capacity"] // 2)])
+    
+    return sketch["heavy"]
+
+
+def sketch_estimate(sketch, n_gram):
+    """
+    Get the approximate count of an n-gram (never lower than the real count; heavy hitters only carry
+    the sketch error of the moment they were promoted, since they are counted exactly from then on)
+    """
+    n_gram = tuple(n_gram)
+    if n_gram in sketch["heavy"]:
+        count, offset = sketch["heavy"][n_gram]
+        estimate = count + offset
+    else:
+        columns = sketch_columns(sketch, [n_gram])[0]
+        estimate = int(sketch["table"][np.arange(len(columns)), columns].min())
+    
+    # Pruned n-grams count as unseen
+    return estimate if estimate >= sketch["min_count"] else 0
+
+
+def prune_approximate_counts(sketch, min_count):
+    """
+    Drop the n-grams seen less than min_count times before the counts are used
+    (heavy hitters below the threshold are removed and any smaller sketch estimate is reported as 0)
+    """
+    sketch["heavy"] = {n_gram: value for n_gram, value in sketch["heavy"].items() if value[0] + value[1] >= min_count}
+    sketch["min_count"] = min_count
+    
+    return sketch
+
+
+class SketchNGramCounts(Mapping):
+    """
+    Read-only view of an approximate count store that behaves like the dictionary returned by count_n_grams,
+    so it can be passed to estimate_probability, estimate_probabilities and suggest_a_word
+    (only the heavy hitters can be iterated)
+    """
+    
+    def __init__(self, sketch):
+        self.sketch = sketch
+        self.n = sketch["n"]
+    
+    def __getitem__(self, n_gram):
+        count = sketch_estimate(self.sketch, n_gram) if isinstance(n_gram, tuple) and len(n_gram) == self.n else 0
+        if count == 0:
+            raise KeyError(n_gram)
+        return count
+    
+    def __iter__(self):
+        return iter(self.sketch["heavy"])
+    
+    def __len__(self):
+        return len(self.sketch["heavy"])
+
+
+def count_shard(tokenized_sentences, n_values, start_token='<s>', end_token='<e>'):
+    """
+    Count the words and the n-grams of one shard of the corpus, before any "<unk>" replacement
+    (so that shards counted separately can be merged and the vocabulary threshold applied afterwards)
+    
+    Args:
+        tokenized_sentences: List of lists of tokens
+        n_values: list of n-gram orders to be counted
+    
+    Returns:
+        A count table: dictionary with the orders ("n_values"), the word counts ("word_counts"),
+        a dictionary of n-gram counts per order ("n_gram_counts") and the number of sentences ("sentences")
+    """
+    n_gram_counts = {n: count_n_grams(tokenized_sentences, n, start_token, end_token) for n in n_values}
+    
+    return {"n_values": list(n_values), "word_counts": count_words(tokenized_sentences), "n_gram_counts": n_gram_counts, "sentences": len(tokenized_sentences)}
+
+
+def merge_count_tables(count_tables):
+    """
+    Merge count tables by adding up their counts
+    
+    Args:
+        count_tables: List of count tables (see count_shard) with the same orders
+    
+    Returns:
+        A new count table
+    """
+    merged = {"n_values": list(count_tables[0]["n_values"]), "word_counts": {}, "n_gram_counts": {n: {} for n in count_tables[0]["n_values"]}, "sentences": 0}
+    for count_table in count_tables:
+        if count_table["n_values"] != merged["n_values"]:
+            raise ValueError("count tables with different n-gram orders cannot be merged")
+        
+        for word, count in count_table["word_counts"].items():
+            merged["word_counts"][word] = merged["word_counts"].get(word, 0) + count
+        for n in merged["n_values"]:
+            merged_n_grams = merged["n_gram_counts"][n]
+            for n_gram, count in count_table["n_gram_counts"][n].items():
+                merged_n_grams[n_gram] = merged_n_grams.get(n_gram, 0) + count
+        merged["sentences"] += count_table["sentences"]
+    
+    # Merged into plain dictionaries, since an NGramCounts records every assignment
+    merged["n_gram_counts"] = {n: NGramCounts(n_grams) for n, n_grams in merged["n_gram_counts"].items()}
+    
+    return merged
+
+
+def count_parallel(tokenized_sentences, n_values, num_shards=None, processes=None):
+    """
+    Split the corpus into shards, count them in a process pool and merge the partial count tables
+    
+    Args:
+        tokenized_sentences: List of lists of tokens
+        n_values: list of n-gram orders to be counted
+        num_shards: number of shards (one per process by default)
+        processes: number of worker processes (all the cores by default)
+    
+    Returns:
+        A count table (see count_shard)
+    """
+    num_shards = num_shards or processes or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        shard_size = max(1, math.ceil(len(tokenized_sentences) / num_shards))
+        shards = [tokenized_sentences[i:i+shard_size] for i in range(0, len(tokenized_sentences), shard_size)]
+        count_tables = list(executor.map(count_shard, shards, [n_values] * len(shards)))
+    
+    if len(count_tables) == 0:
+        return count_shard([], n_values)
+    
+    return merge_count_tables(count_tables)
+
+
+def update_count_table(count_table, new_tokenized_sentences, num_shards=None, processes=None):
+    """
+    Add new sentences to an existing count table, counting only the new data
+    
+    Returns:
+        A new count table with the counts of both
+    """
+    new_count_table = count_parallel(new_tokenized_sentences, count_table["n_values"], num_shards, processes)
+    
+    return merge_count_tables([count_table, new_count_table])
+
+
+def save_count_table(count_table, path):
+    """
+    Save a count table as a pickle so that new shards can be merged into it later
+    """
+    with open(path, "wb") as f:
+        pickle.dump(count_table, f)
+
+
+def load_count_table(path):
+    """
+    Load a count table saved with save_count_table
+    """
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def finalize_count_table(count_table, count_threshold, unknown_token="<unk>", start_token='<s>', end_token='<e>'):
+    """
+    Apply the vocabulary threshold to a (merged) count table, giving the same result as preprocess_data
+    followed by count_n_grams on the whole corpus
+    
+    Args:
+        count_table: count table (see count_shard)
+        count_threshold: words whose count is less than this are treated as unknown
+    
+    Returns:
+        Tuple of
+        - vocabulary of words that appear count_threshold times or more
+        - list of dictionaries with the n-gram counts, one per order of the count table
+    """
+    vocabulary = [word for word, cnt in count_table["word_counts"].items() if cnt >= count_threshold]
+    
+    # Padding tokens are kept as they are, every other word out of the vocabulary becomes the unknown token
+    kept = set(vocabulary) | {start_token, end_token}
+    n_gram_counts_list = []
+    for n in count_table["n_values"]:
+        n_gram_counts = {}
+        for n_gram, count in count_table["n_gram_counts"][n].items():
+            n_gram = tuple(word if word in kept else unknown_token for word in n_gram)
+            n_gram_counts[n_gram] = n_gram_counts.get(n_gram, 0) + count
+        n_gram_counts_list.append(NGramCounts(n_gram_counts))
+    
+    return vocabulary, n_gram_counts_list
+
+
+class SuggestionCache:
+    """
+    Bounded LRU cache in front of get_suggestions and suggest_a_word for interactive autocomplete
+    
+    Entries are keyed by (context n-gram, start_with, k, model) where the context is only the part of previous_tokens
+    the model can see, and the model key is made of the cache_key of every count store (NGramCounts or trie views),
+    which changes as soon as the counts change (count_n_grams updating a dictionary in place, a new trie, ...).
+    Other count stores (e.g. plain dictionaries) have no such key, so their suggestions are computed without
+    the cache. The number of hits and misses is kept for monitoring.
+    """
+    
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def model_key(self, n_gram_counts_list):
+        # Identity and version of every count store, or None if one of them can't tell when it changes
+        if not all(hasattr(counts, "cache_key") for counts in n_gram_counts_list):
+            return None
+        return tuple(counts.cache_key() for counts in n_gram_counts_list)
+    
+    def lookup(self, key, compute):
+        # Stores that can't tell when they change are never cached (the model key is None)
+        if key[-1] is None:
+            return compute()
+        
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        
+        self.misses += 1
+        value = compute()
+        self.entries[key] = value
+        
+        # Dropping the least recently used entry when the cache is full
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+        
+        return value
+    
+    def get_suggestions(self, previous_tokens, n_gram_counts_list, vocabulary, k=1.0, start_with=None, successor_indexes=None, prefix_index=None):
+        """
+        Cached version of get_suggestions (same arguments and result)
+        """
+        # The longest context used by any of the models
+        n = max(n_gram_order(n_gram_counts) for n_gram_counts in n_gram_counts_list[:-1])
+        key = ("get_suggestions", tuple(previous_tokens[-n:]), start_with, k, len(vocabulary), self.model_key(n_gram_counts_list))
+        
+        return self.lookup(key, lambda: get_suggestions(previous_tokens, n_gram_counts_list, vocabulary, k=k, start_with=start_with, successor_indexes=successor_indexes, prefix_index=prefix_index))
+    
+    def suggest_a_word(self, previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabulary, k=1.0, start_with=None, successor_index=None, prefix_index=None):
+        """
+        Cached version of suggest_a_word (same arguments and result)
+        """
+        n = n_gram_order(n_gram_counts)
+        key = ("suggest_a_word", tuple(previous_tokens[-n:]), start_with, k, len(vocabulary), self.model_key([n_gram_counts, n_plus1_gram_counts]))
+        
+        return self.lookup(key, lambda: suggest_a_word(previous_tokens, n_gram_counts, n_plus1_gram_counts, vocabulary, k=k, start_with=start_with, successor_index=successor_index, prefix_index=prefix_index))
+    
+    def clear(self):
+        self.entries.clear()
+    
+    def stats(self):
+        """
+        Get the cache statistics as a dictionary (hits, misses, hit rate and current size)
+        """
+        total = self.hits + self.misses
+        
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total > 0 else 0.0, "size": len(self.entries)}
+
+
+def suggest_batch(contexts, trie, n, k=1.0, start_withs=None, start_token='<s>'):
+    """
+    Get the most likely next word for many contexts in one vectorized pass over one model order
+    (same result as suggest_a_word on the trie views of orders n and n+1)
+    
+    Args:
+        contexts: List of token lists (only the last n tokens of each one are used)
+        trie: n-gram trie (see build_ngram_trie) with orders up to n+1
+        n: number of words of the context
+        k: positive constant, smoothing parameter
+        start_withs: If not None, list with the first few letters of the next word (or None) for every context
+    
+    Returns:
+        List of tuples (suggestion, probability), one per context
+    """
+    id_to_word = trie["id_to_word"]
+    vocabulary_size = trie_vocabulary_size(trie, start_token)
+    start_withs = start_withs if start_withs is not None else [None] * len(contexts)
+    
+    nodes = np.array([context_node(trie, context, n) for context in contexts], dtype=np.int64)
+    context_counts = np.where(nodes >= 0, np.asarray(trie["counts"][n - 1])[np.maximum(nodes, 0)], 0)
+    denominators = context_counts + k * vocabulary_size
+    
+    # Range of word ids allowed for every context (the words starting with its start_with)
+    ranges = np.array([prefix_range(id_to_word, start_with) for start_with in start_withs], dtype=np.int64).reshape(-1, 2)
+    
+    # Scoring the observed successors of all the contexts together and keeping the allowed ones
+    owners, word_ids, children, counts = trie_successors_many(trie, n, nodes)
+    allowed = (word_ids >= ranges[owners, 0]) & (word_ids < ranges[owners, 1]) & (word_ids != trie["word_to_id"][start_token])
+    owners, word_ids, counts = owners[allowed], word_ids[allowed], counts[allowed]
+    
+    # Best successor per context: sorting by context, then by decreasing count, then by word id (alphabetical ties)
+    order = np.lexsort((word_ids, -counts, owners))
+    first = order[np.r_[True, owners[order][1:] != owners[order][:-1]]] if len(order) > 0 else order
+    best_words = np.full(len(contexts), -1, dtype=np.int64)
+    best_counts = np.zeros(len(contexts), dtype=np.int64)
+    best_words[owners[first]] = word_ids[first]
+    best_counts[owners[first]] = counts[first]
+    
+    suggestions = []
+    for i in range(len(contexts)):
+        word = id_to_word[best_words[i]] if best_words[i] >= 0 else first_candidate(None, None, start_withs[i], id_to_word, start_token)
+        probability = (best_counts[i] + k) / denominators[i] if word is not None else 0
+        suggestions.append((word, float(probability)) if probability > 0 else (None, 0))
+    
+    return suggestions
+
+
+def encode_corpus(data, word_to_id, unknown_token="<unk>"):
+    """
+    Encode tokenized sentences as one flat array of word ids plus the offset where every sentence starts
+    
+    Args:
+        data: List of lists of tokens
+        word_to_id: dictionary that maps each word to its id
+    
+    Returns:
+        Tuple of
+        - NumPy int32 array with the word ids of all the sentences one after the other
+        - NumPy int64 array of len(data)+1 offsets (sentence i is tokens[offsets[i]:offsets[i+1]])
+    """
+    unknown_id = word_to_id[unknown_token]
+    tokens = np.fromiter((word_to_id.get(token, unknown_id) for sentence in data for token in sentence), dtype=np.int32)
+    offsets = np.concatenate(([0], np.cumsum([len(sentence) for sentence in data], dtype=np.int64)))
+    
+    return tokens, offsets
+
+
+def split_corpus(tokens, offsets):
+    """
+    Get the list of sentences (arrays of word ids, as views of the flat array) of an encoded corpus
+    """
+    return np.split(tokens, offsets[1:-1]) if len(offsets) > 1 else []
+
+
+def decode_corpus(tokens, offsets, id_to_word):
+    """
+    Get the list of lists of tokens of an encoded corpus
+    """
+    return [[id_to_word[word_id] for word_id in sentence] for sentence in split_corpus(tokens, offsets)]
+
+
+def corpus_cache_key(path, parameters):
+    """
+    Hash the content of the corpus file together with the preprocessing parameters
+    
+    Args:
+        path: path to the corpus file
+        parameters: dictionary with every parameter that changes the preprocessed data (threshold, tokenizer, split...)
+    
+    Returns:
+        Hexadecimal string identifying the preprocessed corpus
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(json.dumps(parameters, sort_keys=True).encode("utf-8"))
+    
+    return digest.hexdigest()
+
+
+def write_directory(directory, write):
+    """
+    Write the files of a cache directory into a temporary directory that is renamed to its final path at the end,
+    so an interrupted run never leaves a partial directory that the next runs would load
+    
+    Args:
+        directory: final path of the directory (replaced if it already exists)
+        write: function called with the path of the temporary directory to write the files into
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    temp_directory = tempfile.mkdtemp(prefix=os.path.basename(directory) + ".tmp-", dir=parent)
+    try:
+        write(temp_directory)
+        # Renaming only replaces an empty directory, so a partial directory left by older versions is removed first
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.replace(temp_directory, directory)
+    except BaseException:
+        shutil.rmtree(temp_directory, ignore_errors=True)
+        raise
+
+
+def save_corpus_cache(cache_dir, key, id_to_word, train_set, test_set):
+    """
+    Save the vocabulary and the encoded training and testing sets under cache_dir/key
+    (vocabulary.json plus flat .npy arrays of word ids and sentence offsets that load_corpus_cache memory-maps)
+    
+    Args:
+        cache_dir: directory of the cache
+        key: output of corpus_cache_key
+        id_to_word: list of words, where the position of each word is its id
+        train_set, test_set: List of lists of tokens (with the rare words already replaced)
+    """
+    word_to_id = {word: i for i, word in enumerate(id_to_word)}
+    
+    def write(directory):
+        with open(os.path.join(directory, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(id_to_word, f)
+        for name, data in (("train", train_set), ("test", test_set)):
+            tokens, offsets = encode_corpus(data, word_to_id)
+            np.save(os.path.join(directory, name + "_tokens.npy"), tokens)
+            np.save(os.path.join(directory, name + "_offsets.npy"), offsets)
+    
+    write_directory(os.path.join(cache_dir, key), write)
+
+
+def load_corpus_cache(cache_dir, key):
+    """
+    Load a corpus saved with save_corpus_cache, memory-mapping the arrays
+    
+    Returns:
+        A dictionary with "id_to_word" and the (tokens, offsets) arrays of "train" and "test", or None if there is no cache for this key
+    """
+    directory = os.path.join(cache_dir, key)
+    files = ["vocabulary.json"] + [name + suffix for name in ("train", "test") for suffix in ("_tokens.npy", "_offsets.npy")]
+    if not all(os.path.exists(os.path.join(directory, file)) for file in files):
+        return None
+    
+    with open(os.path.join(directory, "vocabulary.json"), "r", encoding="utf-8") as f:
+        corpus = {"id_to_word": json.load(f)}
+    for name in ("train", "test"):
+        corpus[name] = (np.load(os.path.join(directory, name + "_tokens.npy"), mmap_mode="r"),
+                        np.load(os.path.join(directory, name + "_offsets.npy"), mmap_mode="r"))
+    
+    return corpus
+
+
+def pad_corpus(tokens, offsets, start_id, end_id):
+    """
+    Insert one start token before and one end token after every sentence of an encoded corpus
+    
+    Args:
+        tokens, offsets: encoded corpus (see encode_corpus)
+        start_id, end_id: ids of the start and end tokens
+    
+    Returns:
+        NumPy int32 array of len(tokens) + 2 * number of sentences word ids
+    """
+    tokens = np.asarray(tokens)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_sentences = len(offsets) - 1
+    lengths = np.diff(offsets)
+    sentence_index = np.arange(num_sentences, dtype=np.int64)
+    
+    # Every token moves 2 positions to the right per sentence before it, plus 1 for its own start token
+    padded = np.empty(len(tokens) + 2 * num_sentences, dtype=np.int32)
+    padded[np.arange(len(tokens)) + 2 * np.repeat(sentence_index, lengths) + 1] = tokens
+    padded[offsets[:-1] + 2 * sentence_index] = start_id
+    padded[offsets[1:] + 2 * sentence_index + 1] = end_id
+    
+    return padded
+
+
+def build_suffix_array(tokens, max_length=None):
+    """
+    Sort all the suffixes of a sequence of word ids by prefix doubling, every round being a vectorized lexsort
+    
+    Args:
+        tokens: NumPy array of word ids
+        max_length: If not None, the suffixes are only sorted by their first max_length tokens (fewer rounds),
+                    which is enough to query n-grams up to that length
+    
+    Returns:
+        NumPy array with the start position of every suffix in increasing order of the suffixes
+    """
+    tokens = np.asarray(tokens)
+    length = len(tokens)
+    dtype = np.int32 if length < 2**31 else np.int64
+    if length == 0:
+        return np.zeros(0, dtype=dtype)
+    
+    # Rank of every suffix by its first token
+    suffix_array = np.argsort(tokens, kind="stable")
+    sorted_tokens = tokens[suffix_array]
+    rank = np.empty(length, dtype=np.int64)
+    rank[suffix_array] = np.cumsum(np.r_[False, sorted_tokens[1:] != sorted_tokens[:-1]])
+    
+    # Sorting by the first 2h tokens from the ranks by the first h tokens, until every rank is distinct
+    h = 1
+    while rank.max() < length - 1 and (max_length is None or h < max_length):
+        second = np.full(length, -1, dtype=np.int64) # suffixes ending before h tokens sort first
+        second[:length - h] = rank[h:]
+        suffix_array = np.lexsort((second, rank))
+        first, second = rank[suffix_array], second[suffix_array]
+        new_group = np.r_[False, (first[1:] != first[:-1]) | (second[1:] != second[:-1])]
+        rank[suffix_array] = np.cumsum(new_group)
+        h *= 2
+    
+    return suffix_array.astype(dtype)
+
+
+def build_suffix_array_index(tokens, offsets, id_to_word, max_length=None, start_token='<s>', end_token='<e>'):
+    """
+    Build a suffix-array index over an encoded corpus to count n-grams of any order at query time
+    
+    Every sentence is padded with a single start token and a single end token, so n-grams starting with several
+    start tokens are looked up with only one of them (see suffix_array_count). No per-order count table is stored.
+    
+    Args:
+        tokens, offsets: encoded corpus (see encode_corpus), e.g. the training set of the corpus cache
+        id_to_word: list of words sorted alphabetically, where the position of each word is its id
+        max_length: If not None, only n-grams up to this length can be queried (see build_suffix_array)
+    
+    Returns:
+        A dictionary with
+        - "id_to_word" / "word_to_id": the vocabulary index (see build_vocabulary_index)
+        - "tokens": the padded corpus
+        - "suffix_array": the sorted suffix positions of "tokens"
+    """
+    word_to_id = {word: i for i, word in enumerate(id_to_word)}
+    padded = pad_corpus(tokens, offsets, word_to_id[start_token], word_to_id[end_token])
+    
+    return {"id_to_word": list(id_to_word), "word_to_id": word_to_id, "tokens": padded, "suffix_array": build_suffix_array(padded, max_length)}
+
+
+def save_suffix_array_index(index, directory):
+    """
+    Save a suffix-array index as vocabulary.json plus .npy arrays that load_suffix_array_index memory-maps
+    """
+    def write(directory):
+        with open(os.path.join(directory, "vocabulary.json"), "w", encoding="utf-8") as f:
+            json.dump(index["id_to_word"], f)
+        np.save(os.path.join(directory, "sa_tokens.npy"), index["tokens"])
+        np.save(os.path.join(directory, "suffix_array.npy"), index["suffix_array"])
+    
+    write_directory(directory, write)
+
+
+def load_suffix_array_index(directory):
+    """
+    Load a suffix-array index saved with save_suffix_array_index, memory-mapping the arrays
+    
+    Returns:
+        The index (see build_suffix_array_index), or None if there is no index in the directory
+    """
+    if not all(os.path.exists(os.path.join(directory, file)) for file in ("vocabulary.json", "sa_tokens.npy", "suffix_array.npy")):
+        return None
+    
+    with open(os.path.join(directory, "vocabulary.json"), "r", encoding="utf-8") as f:
+        id_to_word = json.load(f)
+    
+    return {"id_to_word": id_to_word, "word_to_id": {word: i for i, word in enumerate(id_to_word)},
+            "tokens": np.load(os.path.join(directory, "sa_tokens.npy"), mmap_mode="r"),
+            "suffix_array": np.load(os.path.join(directory, "suffix_array.npy"), mmap_mode="r")}
+
+
+def encode_query(index, n_gram, start_token='<s>', end_token='<e>'):
+    """
+    Convert an n-gram into the word ids searched in the suffix array
+    
+    Leading start tokens are collapsed into one (every sentence is padded once), which gives the same counts as
+    count_n_grams(data, n) for any n-gram.
+    
+    Returns:
+        List of word ids, or None if the n-gram can't occur in the padded corpus (unknown word, start token
+        inside the n-gram or end token before its last position)
+    """
+    word_to_id = index["word_to_id"]
+    start_id, end_id = word_to_id[start_token], word_to_id[end_token]
+    
+    word_ids = [word if isinstance(word, (int, np.integer)) else word_to_id.get(word, -1) for word in n_gram]
+    while len(word_ids) > 1 and word_ids[0] == start_id and word_ids[1] == start_id:
+        word_ids = word_ids[1:]
+    
+    if -1 in word_ids or start_id in word_ids[1:] or end_id in word_ids[:-1]:
+        return None
+    
+    return word_ids
+
+
+def suffix_array_range(index, word_ids):
+    """
+    Find the range of the suffix array whose suffixes start with a sequence of word ids
+    
+    The range is narrowed one word at a time: inside the range of the first j words, the suffixes are sorted
+    by their (j+1)-th word, so two binary searches on that word give the range of the first j+1 words.
+    
+    Args:
+        index: suffix-array index (see build_suffix_array_index)
+        word_ids: list of word ids (see encode_query)
+    
+    Returns:
+        Tuple (lo, hi) of positions in the suffix array (lo == hi if the sequence never occurs)
+    """
+    tokens = index["tokens"]
+    suffix_array = index["suffix_array"]
+    length = len(tokens)
+    
+    lo, hi = 0, len(suffix_array)
+    for j, word_id in enumerate(word_ids):
+        # Suffixes shorter than j+1 tokens sort first, like the suffixes ending before h tokens in build_suffix_array
+        word_at = lambda position: int(tokens[position + j]) if position + j < length else -1
+        lo, hi = bisect.bisect_left(suffix_array, word_id, lo, hi, key=word_at), bisect.bisect_right(suffix_array, word_id, lo, hi, key=word_at)
+        if lo == hi:
+            break
+    
+    return lo, hi
+
+
+def suffix_array_count(index, n_gram):
+    """
+    Get the count of an n-gram of any order from a suffix-array index (0 if it was never seen)
+    """
+    word_ids = encode_query(index, n_gram)
+    if word_ids is None or len(word_ids) == 0:
+        return 0
+    lo, hi = suffix_array_range(index, word_ids)
+    
+    return hi - lo
+
+
+def suffix_array_successors(index, context):
+    """
+    Get the words observed after a context of any length
+    
+    Args:
+        index: suffix-array index (see build_suffix_array_index)
+        context: sequence of words or word ids
+    
+    Returns:
+        Tuple of NumPy arrays with the ids of the following words (sorted) and the counts of context + word
+    """
+    empty = np.zeros(0, dtype=np.int64)
+    word_ids = encode_query(index, context)
+    if word_ids is None or (len(word_ids) > 0 and word_ids[-1] == index["word_to_id"]['<e>']):
+        return empty, empty
+    
+    # The word after the context is at the same offset in every suffix of the range
+    lo, hi = suffix_array_range(index, word_ids)
+    next_ids = np.asarray(index["tokens"])[np.asarray(index["suffix_array"][lo:hi], dtype=np.int64) + len(word_ids)]
+    next_ids, counts = np.unique(next_ids, return_counts=True)
+    
+    return next_ids.astype(np.int64), counts.astype(np.int64)
+
+
+def longest_context(index, previous_tokens, max_context=None):
+    """
+    Find the longest suffix of the previous tokens observed in the corpus
+    
+    Args:
+        index: suffix-array index (see build_suffix_array_index)
+        previous_tokens: The sentence you input where each token is a word
+        max_context: If not None, maximum number of words of the context
+    
+    Returns:
+        Tuple of the context (tuple of words, possibly empty) and its count
+    """
+    max_context = len(previous_tokens) if max_context is None else min(max_context, len(previous_tokens))
+    
+    # Every suffix of an observed context is observed too, so the lengths are tried from the longest one
+    for length in range(max_context, 0, -1):
+        context = tuple(previous_tokens[-length:])
+        count = suffix_array_count(index, context)
+        if count > 0:
+            return context, count
+    
+    return (), len(index["tokens"])
+
+
+def suffix_array_suggestions(previous_tokens, index, k=1.0, start_with=None, max_context=None, num_suggestions=1, start_token='<s>'):
+    """
+    Get suggestions from the longest matching context of any length, with the same k-smoothed probabilities as
+    estimate_probability for an n-gram model of that order. Shorter contexts are used when no observed word
+    of the longest context starts with start_with.
+    
+    Args:
+        previous_tokens: The sentence you input where each token is a word
+        index: suffix-array index (see build_suffix_array_index)
+        k: positive constant, smoothing parameter
+        start_with: If not None, specifies the first few letters of the next word
+        max_context: If not None, maximum number of words of the context
+        num_suggestions: number of suggestions to return
+    
+    Returns:
+        A list of at most num_suggestions tuples (suggestion, probability) sorted from the best one
+    """
+    id_to_word = index["id_to_word"]
+    vocabulary_size = len(id_to_word) - (start_token in index["word_to_id"])
+    lo_id, hi_id = prefix_range(id_to_word, start_with)
+    
+    context, _ = longest_context(index, previous_tokens, max_context)
+    while True:
+        word_ids, counts = suffix_array_successors(index, context)
+        denominator = (suffix_array_count(index, context) if len(context) > 0 else len(index["tokens"])) + k * vocabulary_size
+        
+        # Keeping the observed words starting with start_with (never the start token)
+        allowed = (word_ids >= lo_id) & (word_ids < hi_id) & (word_ids != index["word_to_id"][start_token])
+        word_ids, counts = word_ids[allowed], counts[allowed]
+        if len(word_ids) > 0 or len(context) == 0:
+            break
+        context = context[1:]
+    
+    # Highest counts first (alphabetically for ties, since the ids follow the alphabetical order)
+    order = np.lexsort((word_ids, -counts))[:num_suggestions]
+    
+    return [(id_to_word[word_ids[i]], float((counts[i] + k) / denominator)) for i in order]
+
+
+def estimate_distributions(contexts, trie, n, k=1.0, start_token='<s>'):
+    """
+    Estimate the whole k-smoothed next-word distribution of many contexts at once (same probabilities as
+    estimate_probabilities on the trie views of orders n and n+1)
+    
+    Every row starts from the probability of the unseen words, k / (count of the context + k * vocabulary size),
+    and the observed successors of all the contexts are scattered over it in one assignment.
+    
+    Args:
+        contexts: List of token lists (only the last n tokens of each one are used)
+        trie: n-gram trie (see build_ngram_trie) with orders up to n+1
+        n: number of words of the context
+        k: positive constant, smoothing parameter
+    
+    Returns:
+        NumPy float32 array of shape (len(contexts), number of word ids), where column i is the probability of
+        trie["id_to_word"][i] (0 for the start token, which is never a next word)
+    """
+    vocabulary_size = trie_vocabulary_size(trie, start_token)
+    
+    nodes = np.array([context_node(trie, context, n) for context in contexts], dtype=np.int64)
+    context_counts = np.where(nodes >= 0, np.asarray(trie["counts"][n - 1])[np.maximum(nodes, 0)], 0)
+    denominators = context_counts + k * vocabulary_size
+    
+    distributions = np.repeat((k / denominators).astype(np.float32)[:, None], len(trie["id_to_word"]), axis=1)
+    owners, word_ids, children, counts = trie_successors_many(trie, n, nodes)
+    distributions[owners, word_ids] = (counts + k) / denominators[owners]
+    distributions[:, trie["word_to_id"][start_token]] = 0
+    
+    return distributions
+
+
+def estimate_distribution(previous_n_gram, trie, n, k=1.0):
+    """
+    Estimate the k-smoothed next-word distribution of one context as a float32 vector indexed by word id
+    (see estimate_distributions)
+    """
+    return estimate_distributions([previous_n_gram], trie, n, k)[0]
+
+
+def distribution_top_k(distributions, top_k):
+    """
+    Get the most likely word ids of one or many distributions (ties in id order, i.e. alphabetically)
+    
+    Args:
+        distributions: NumPy array of shape (number of word ids,) or (number of contexts, number of word ids)
+        top_k: number of words to keep
+    
+    Returns:
+        Tuple of NumPy arrays (word ids, probabilities) with the same leading shape and top_k columns, best first
+    """
+    distributions = np.asarray(distributions)
+    top_k = min(top_k, distributions.shape[-1])
+    
+    # Sorting the whole rows by decreasing probability (stable, so equal probabilities keep the id order)
+    word_ids = np.argsort(-distributions, axis=-1, kind="stable")[..., :top_k]
+    
+    return word_ids, np.take_along_axis(distributions, word_ids, axis=-1)
+
+
+def distribution_entropy(distributions):
+    """
+    Get the entropy (in bits) of one or many distributions
+    """
+    distributions = np.asarray(distributions, dtype=np.float64)
+    terms = np.where(distributions > 0, -distributions * np.log2(np.where(distributions > 0, distributions, 1)), 0)
+    
+    return terms.sum(axis=-1)
+
+
+def sample_distributions(distributions, num_samples=1, seed=None):
+    """
+    Sample word ids from one or many distributions (inverse transform sampling on the cumulative sums)
+    
+    Returns:
+        NumPy array of word ids with the leading shape of the distributions and num_samples columns
+    """
+    distributions = np.asarray(distributions, dtype=np.float64)
+    cumulative = np.cumsum(distributions, axis=-1)
+    
+    # The float32 probabilities may not sum exactly to 1, so the uniform draws are scaled by every total
+    draws = np.random.default_rng(seed).random(distributions.shape[:-1] + (num_samples,)) * cumulative[..., -1:]
+    rows, row_draws = cumulative.reshape(-1, cumulative.shape[-1]), draws.reshape(-1, num_samples)
+    word_ids = np.array([np.searchsorted(row, row_draw, side="right") for row, row_draw in zip(rows, row_draws)])
+    
+    return np.minimum(word_ids, distributions.shape[-1] - 1).reshape(draws.shape)
@@ -56,8 +56,8 @@ print('English sentences in database:', len(english_sentences))
 # Processing every single segment and retrieve the cleaned words
 words_all = []
 print('\nRetrieving words from corpus...')
-for sentence in english_sentences:
-    words_all += process_sentence(sentence)
+for sentence_words in process_sentences(english_sentences): # tokenizing all the segments in one batch
+    words_all += sentence_words
 
 vocab = sorted(list(set(words_all))) # keeping just unique words and ordered alphabetically
 print('Total words in corpus:', len(words_all))
@@ -79,14 +79,36 @@ probs = get_probs(freqs, len(words_all))
 ##with open("pickled/probs.pickle", "wb") as f:
 ##    pickle.dump(probs, f)
 
+# Building the deletion index: every word of the vocabulary is reachable from the deletes of its misspellings
+print('Building deletion index...')
+deletion_index = build_deletion_index(vocab, max_distance=2)
+
+### Saving the deletion index as a pickle
+##save_deletion_index(deletion_index, "pickled/deletion_index.pickle")
+
+# Method used to find the candidates: "deletion_index", "vocab_trie" (any number of edits) or "edits" (generating every edit of the word)
+correction_method = "deletion_index"
+
 # Testing the spell checker
 word = "automatoin" # incorrectly spelled word
 print('Word:', word)
 
 if word not in vocab:
-    corrections = get_corrections(word, probs, vocab, 3)
+    if correction_method == "deletion_index":
+        corrections = get_corrections_from_index(word, probs, deletion_index, 3)
+    elif correction_method == "vocab_trie":
+        corrections = get_corrections_from_trie(word, probs, build_vocab_trie(vocab), 3, max_distance=2)
+    else:
+        corrections = get_corrections(word, probs, vocab, 3)
     print('Corrections:', [correction[0] for correction in corrections])
 else:
     print('The word is spelled correctly.')
 
+# Checking whole documents (or TMX segments) at once: every distinct unknown word is corrected once, in a pool of processes, and cached for the next calls
+if __name__ == "__main__":
+    with SpellChecker(probs, vocab, 3, deletion_index) as checker:
+        documents = ["The automatoin of the procces is importnat.", "Teh procces is an automatoin."]
+        for document, result in zip(documents, checker.check(documents)):
+            print('\nDocument:', document)
+            print('Corrections:', [(document[start:end], (start, end), [correction[0] for correction in corrections]) for (start, end), word, corrections in result])
 
@@ -12,14 +12,35 @@ with open("pickled/probs.pickle", "rb") as f:
 
 print('Unique words in corpus:', len(vocab))
 
+# Loading the deletion index if it has been saved, or building it from the vocabulary otherwise
+if os.path.exists("pickled/deletion_index.pickle"):
+    deletion_index = load_deletion_index("pickled/deletion_index.pickle")
+else:
+    deletion_index = build_deletion_index(vocab, max_distance=2)
+
+# Method used to find the candidates: "deletion_index", "vocab_trie" (any number of edits) or "edits" (generating every edit of the word)
+correction_method = "deletion_index"
+
 # Testing the spell checker
 word = "automatoin" # incorrectly spelled word
 print('Word:', word)
 
 if word not in vocab:
-    corrections = get_corrections(word, probs, vocab, 3)
+    if correction_method == "deletion_index":
+        corrections = get_corrections_from_index(word, probs, deletion_index, 3)
+    elif correction_method == "vocab_trie":
+        corrections = get_corrections_from_trie(word, probs, build_vocab_trie(vocab), 3, max_distance=2)
+    else:
+        corrections = get_corrections(word, probs, vocab, 3)
     print('Corrections:', [correction[0] for correction in corrections])
 else:
     print('The word is spelled correctly.')
 
+# Checking whole documents (or TMX segments) at once: every distinct unknown word is corrected once, in a pool of processes, and cached for the next calls
+if __name__ == "__main__":
+    with SpellChecker(probs, vocab, 3, deletion_index) as checker:
+        documents = ["The automatoin of the procces is importnat.", "Teh procces is an automatoin."]
+        for document, result in zip(documents, checker.check(documents)):
+            print('\nDocument:', document)
+            print('Corrections:', [(document[start:end], (start, end), [correction[0] for correction in corrections]) for (start, end), word, corrections in result])
 
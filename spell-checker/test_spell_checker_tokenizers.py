@@ -0,0 +1,39 @@
+import importlib.util
+import os
+import pytest
+from nltk.tokenize.destructive import NLTKWordTokenizer
+
+# Loading spell-checker/utils.py under its own name (n-gram has a utils.py too)
+spec = importlib.util.spec_from_file_location("spell_checker_utils", os.path.join(os.path.dirname(__file__), "utils.py"))
+utils = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(utils)
+
+SENTENCES = [
+    "I can't believe it's not butter.",
+    "You wanna go? I'm gonna stay",
+    "gimme that, lemme see... we cannot",
+    "They'd've said \"hello\" and 'goodbye'",
+    "“Quoted” text with ‘single’ quotes and « guillemets » — dashes – too",
+    "Prices rose 3.5% to $1,000.00 (again) [see note]",
+    "i wanna",
+    "Wanna",
+    "GOTTA go, Gonna stay",
+    "",
+]
+
+
+@pytest.fixture
+def nltk_word(monkeypatch):
+    # Reference backend: NLTKWordTokenizer is the tokenizer word_tokenize applies to every sentence
+    tokenizer = NLTKWordTokenizer()
+    monkeypatch.setitem(utils.TOKENIZERS, "nltk_word", lambda sentences: [tokenizer.tokenize(sentence) for sentence in sentences])
+    return "nltk_word"
+
+
+def test_regex_backend_matches_nltk_word_tokenizer(nltk_word):
+    assert utils.compare_tokenizers(SENTENCES, "regex", nltk_word) == []
+
+
+def test_regex_backend_batch_matches_single_calls():
+    assert utils.process_sentences(SENTENCES) == [utils.process_sentence(sentence) for sentence in SENTENCES]
+    assert utils.process_sentences([]) == []
@@ -1,10 +1,24 @@
+import os
 import sqlite3
+import pickle
 import re
 import xml.etree.ElementTree as ET
 import string
 import numpy as np
 from nltk.tokenize import word_tokenize
-from collections import Counter
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# Translation table removing punctuation and numbers, built only once
+REMOVED_CHARACTERS = frozenset(string.punctuation + '0123456789')
+CLEAN_TABLE = str.maketrans('', '', ''.join(REMOVED_CHARACTERS))
+
+# Corrections of the unknown words already checked by the spell checkers, shared across calls (least recently used entries are dropped first)
+CORRECTIONS_CACHE = OrderedDict()
+
+# Once punctuation is removed, the only things word_tokenize still splits are unicode quotes/dashes and a few contractions
+QUOTES_AND_DASHES = re.compile("[«“‘„»”’\u2012-\u2015]")
+CONTRACTIONS = re.compile(r"(?i)\b(can)(not)\b|\b(gim|lem)(me)\b|\b(gon)(na)\b|\b(got)(ta)\b|\b(wan)(na)(?=\s)")
 
 # Method to parse a TMX file and dump its contents into a database
 def tmx_to_sql(db_path, tmx_path):
@@ -72,28 +86,91 @@ def tmx_to_sql(db_path, tmx_path):
     conn.close()
 
 
+# Method to split a batch of cleaned sentences (no punctuation) into words with the precompiled regexes
+def regex_tokenize_batch(sentences):
+    '''
+    Input:
+        sentences: a list of strings without punctuation
+    Output:
+        tokenized: a list with the list of words of every sentence (same output as word_tokenize for these sentences)
+    '''
+    
+    if len(sentences) == 0:
+        return []
+    
+    # Tokenizing the whole batch at once, one sentence per line (padded with spaces like word_tokenize does before the contractions)
+    text = "\n".join(sentence.replace("\n", " ") for sentence in sentences)
+    text = QUOTES_AND_DASHES.sub(r" \g<0> ", text)
+    text = " " + text.replace("\n", " \n ") + " "
+    text = CONTRACTIONS.sub(lambda match: " " + " ".join(group for group in match.groups() if group) + " ", text)
+    tokenized = [line.split() for line in text.split("\n")]
+    
+    return tokenized
+
+
+# Method to split a batch of sentences into words with nltk (reference backend)
+def nltk_tokenize_batch(sentences):
+    '''
+    Input:
+        sentences: a list of strings
+    Output:
+        tokenized: a list with the list of words of every sentence
+    '''
+    return [word_tokenize(sentence) for sentence in sentences]
+
+
+# Tokenizer backends that can be chosen by name
+TOKENIZERS = {"regex": regex_tokenize_batch, "nltk": nltk_tokenize_batch}
+
+
+# Method to clean or pre-process many sentences at once
+def process_sentences(sentences, tokenizer="regex"):
+    '''
+    Input:
+        sentences: a list of strings containing the retrieved sentences
+        tokenizer: name of the tokenizer backend ("regex" or "nltk")
+    Output:
+        sentences_clean: a list with the list of processed words of every sentence
+    '''
+    # Removing punctuation and numbers from every sentence with the precompiled translation table
+    sentences = [sentence.translate(CLEAN_TABLE) for sentence in sentences]
+    
+    # Tokenizing all the sentences in one batch and lowering the words
+    sentences_clean = [[word.lower() for word in tokens] for tokens in TOKENIZERS[tokenizer](sentences)]
+    
+    return sentences_clean
+
+
 # Method to clean or pre-process the sentence before its use
-def process_sentence(sentence):
+def process_sentence(sentence, tokenizer="regex"):
     '''
     Input:
         sentence: a string containing the retrieved sentence
+        tokenizer: name of the tokenizer backend ("regex" or "nltk")
     Output:
         sentence_clean: a list of words containing the processed sentence
     '''
-    # Removing punctuation from the sentence
-    sentence = sentence.translate(str.maketrans('', '', string.punctuation))
-    sentence = re.sub('[0-9]', '', sentence) # removing numbers
-    
-    # Tokenizing sentence
-    sentence_tokens = word_tokenize(sentence)
-    
-    sentence_clean = []
-    for word in sentence_tokens:
-        sentence_clean.append(word.lower()) # lowering word
+    sentence_clean = process_sentences([sentence], tokenizer)[0]
     
     return sentence_clean
 
 
+# Method to check the parity of a tokenizer backend against the reference one
+def compare_tokenizers(sentences, backend="regex", reference="nltk"):
+    '''
+    Input:
+        sentences: a list of strings
+        backend, reference: names of the tokenizer backends to compare
+    Output:
+        mismatches: a list of tuples (sentence, reference words, backend words) for every sentence where they differ
+    '''
+    backend_words = process_sentences(sentences, backend)
+    reference_words = process_sentences(sentences, reference)
+    mismatches = [(sentence, expected, words) for sentence, expected, words in zip(sentences, reference_words, backend_words) if expected != words]
+    
+    return mismatches
+
+
 # Method to build the frequency dictionary
 def build_freqs(words_all):
     '''
@@ -281,10 +358,469 @@ def get_corrections(word, probs, vocab, n):
         for further_suggestion in further_suggestions:
             if further_suggestion in vocab:
                 prob = probs[further_suggestion]
-                suggestions_dict[suggestion] = prob
+                suggestions_dict[further_suggestion] = prob
+
+    # Sorting the dictionary with the helper function Counter to get the most common words
+    c = Counter(suggestions_dict)
+    n_best = c.most_common(n) # list of tuples (word, probability) sorted by most common
+    
+    return n_best
+
+
+# Method to get the number of edits between two words (deletions, insertions, replacements and switches of adjacent letters)
+def damerau_levenshtein_distance(source, target, max_distance):
+    '''
+    Input:
+        source: a string
+        target: a string
+        max_distance: the highest distance we are interested in
+    Output:
+        distance: the smallest number of edits turning source into target, or max_distance + 1 if it is higher than max_distance
+                  (unlike the optimal string alignment distance, a switch can be combined with other edits, e.g. deleting "w" and then switching "gr" turns "segwrei" into "sergei")
+    '''
+    too_far = max_distance + 1
+    if abs(len(source) - len(target)) > max_distance:
+        return too_far
+    
+    # Full table with an extra first row and column (Lowrance-Wagner): D[i+1][j+1] is the distance between source[:i] and target[:j]
+    infinity = len(source) + len(target)
+    D = [[infinity] * (len(target) + 2)] + [[infinity] + [0] * (len(target) + 1) for _ in range(len(source) + 1)]
+    for i in range(len(source) + 1):
+        D[i+1][1] = i
+    for j in range(len(target) + 1):
+        D[1][j+1] = j
+    
+    last_row = {} # last row where every character of source has been seen
+    for i in range(1, len(source) + 1):
+        last_column = 0 # last column of this row where target matched source[i-1]
+        for j in range(1, len(target) + 1):
+            i1 = last_row.get(target[j-1], 0)
+            j1 = last_column
+            cost = 1
+            if source[i-1] == target[j-1]:
+                cost = 0
+                last_column = j
+            
+            # Replacement (or match), insertion, deletion, and switch of source[i1-1] and source[i-1] with the characters in between deleted or inserted
+            D[i+1][j+1] = min(D[i][j] + cost, D[i+1][j] + 1, D[i][j+1] + 1, D[i1][j1] + (i - i1 - 1) + 1 + (j - j1 - 1))
+        last_row[source[i-1]] = i
+        
+        # Stopping as soon as every cell of the row is over the maximum distance (the next rows can't be lower)
+        if min(D[i+1][1:]) > max_distance:
+            return too_far
+    
+    distance = D[-1][-1]
+    
+    return distance if distance <= max_distance else too_far
+
+
+# Method to get every string obtained by deleting up to max_distance characters from a word
+def get_deletes(word, max_distance):
+    '''
+    Input:
+        word: input word
+        max_distance: maximum number of deleted characters
+    Output:
+        deletes: a set with the word itself and all its deletes
+    '''
+    deletes = {word}
+    level = {word}
+    for _ in range(max_distance):
+        level = {delete for edited in level for delete in delete_letter(edited)} # deleting one more character from the previous level
+        deletes |= level
+    
+    return deletes
+
+
+# Method to build the symmetric deletion index (every delete of a word points to the word)
+def build_deletion_index(vocab, max_distance=2, prefix_length=7):
+    '''
+    Input:
+        vocab: a list containing all the vocabulary
+        max_distance: maximum number of edits of the corrections
+        prefix_length: only the first prefix_length characters of every word are used for the deletes (keeps the index small for long words), or None to use the whole words
+    Output:
+        deletion_index: a dictionary with the settings of the index and the dictionary mapping every delete to the list of words that produce it
+    '''
+    deletes = {}
+    for word in vocab:
+        for delete in get_deletes(word[:prefix_length], max_distance):
+            if delete in deletes:
+                deletes[delete].append(word)
+            else:
+                deletes[delete] = [word]
+    
+    deletion_index = {"max_distance": max_distance, "prefix_length": prefix_length, "deletes": deletes}
+    
+    return deletion_index
+
+
+# Method to save the deletion index as a pickle
+def save_deletion_index(deletion_index, path):
+    with open(path, "wb") as f:
+        pickle.dump(deletion_index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+# Method to load the deletion index from a pickle
+def load_deletion_index(path):
+    with open(path, "rb") as f:
+        deletion_index = pickle.load(f)
+    
+    return deletion_index
+
+
+# Method to get the vocabulary words within max_distance edits of a word, with their distance
+def get_candidates(word, deletion_index, max_distance=None):
+    '''
+    Input:
+        word: a user entered word to check for suggestions
+        deletion_index: the output of build_deletion_index
+        max_distance: maximum number of edits (it can't be higher than the one used to build the index)
+    Output:
+        candidates: a dictionary where keys are the vocabulary words within max_distance edits and values are their distance
+    '''
+    if max_distance == None:
+        max_distance = deletion_index["max_distance"]
+    max_distance = min(max_distance, deletion_index["max_distance"])
+    
+    # Any word within max_distance edits shares a delete of its prefix with the word (a few hash lookups), and every candidate is then verified
+    candidates = {}
+    deletes = deletion_index["deletes"]
+    for delete in get_deletes(word[:deletion_index["prefix_length"]], max_distance):
+        for candidate in deletes.get(delete, []):
+            if candidate not in candidates:
+                candidates[candidate] = damerau_levenshtein_distance(word, candidate, max_distance)
+    
+    candidates = {candidate: distance for candidate, distance in candidates.items() if distance <= max_distance}
+    
+    return candidates
+
+
+# Same as get_corrections, getting the candidate words from the deletion index instead of generating every edit of the word
+def get_corrections_from_index(word, probs, deletion_index, n, max_distance=None):
+    '''
+    Input:
+        word: a user entered word to check for suggestions
+        probs: a dictionary that maps each word to its probability in the corpus
+        deletion_index: the output of build_deletion_index
+        n: number of possible word corrections you want returned in the dictionary
+        max_distance: maximum number of edits (by default, the one used to build the index)
+    Output:
+        n_best: a list of tuples with the most probable n corrected words and their probabilities
+    '''
+    candidates = get_candidates(word, deletion_index, max_distance)
+    
+    # Keeping only the closest candidates (the words at two edits are only suggested if there is none at one edit), like get_corrections
+    suggestions_dict = {}
+    if len(candidates) > 0:
+        min_distance = min(candidates.values())
+        suggestions_dict = {candidate: probs[candidate] for candidate, distance in candidates.items() if distance == min_distance}
+    
+    # Sorting the dictionary with the helper function Counter to get the most common words
+    c = Counter(suggestions_dict)
+    n_best = c.most_common(n) # list of tuples (word, probability) sorted by most common
+    
+    return n_best
+
+
+# Method to build a trie of the vocabulary (one node per prefix)
+def build_vocab_trie(vocab):
+    '''
+    Input:
+        vocab: a list containing all the vocabulary
+    Output:
+        vocab_trie: the root node, where every node is a list [dictionary mapping the next characters to the child nodes, word ending at this node or None,
+                    length of the shortest word below this node, length of the longest word below this node]
+    '''
+    vocab_trie = [{}, None, float("inf"), 0]
+    for word in vocab:
+        node = vocab_trie
+        for char in [None] + list(word):
+            if char is not None:
+                if char not in node[0]:
+                    node[0][char] = [{}, None, float("inf"), 0]
+                node = node[0][char]
+            node[2] = min(node[2], len(word)) # the lengths let the search skip the branches whose words are all too short or too long
+            node[3] = max(node[3], len(word))
+        node[1] = word # the word is complete at this node
+    
+    return vocab_trie
+
+
+# Method to find the vocabulary words within max_distance edits of a word by walking the trie
+def search_vocab_trie(word, vocab_trie, max_distance=2):
+    '''
+    Input:
+        word: a user entered word to check for suggestions
+        vocab_trie: the output of build_vocab_trie
+        max_distance: maximum number of edits (deletions, insertions, replacements and switches of adjacent letters)
+    Output:
+        candidates: a dictionary where keys are the vocabulary words within max_distance edits and values are their distance
+    '''
+    candidates = {}
+    too_far = max_distance + 1 # every value over max_distance is stored as max_distance + 1
+    length = len(word)
+    
+    # Every trie node extends the edit distance table by one row (same recurrence as damerau_levenshtein_distance), so the words sharing a prefix share
+    # its rows. Only the cells within max_distance of the diagonal can be within max_distance, so row i only keeps the columns max(0, i - max_distance)
+    # to min(len(word), i + max_distance). A switch reaches back at most max_distance + 1 rows, so each stack entry is (node, character, row number,
+    # history) where history holds (row number, character, first column, cells) for the last max_distance + 1 rows, newest first
+    first_row = (0, None, 0, [min(j, too_far) for j in range(min(length, max_distance) + 1)])
+    stack = [(child, char, 1, (first_row,)) for char, child in vocab_trie[0].items()]
+    while len(stack) > 0:
+        node, char, i, history = stack.pop()
+        children, node_word, shortest, longest = node
+        start, end = max(0, i - max_distance), min(length, i + max_distance)
+        if longest < length - max_distance or shortest > length + max_distance or start > end:
+            continue
+        
+        _, _, previous_start, previous_cells = history[0]
+        previous_end = previous_start + len(previous_cells)
+        last_column = word.rfind(char, 0, max(start - 1, 0)) + 1 # last column before the band where the word has this character
+        cells = [i if i < too_far else too_far] if start == 0 else []
+        left = cells[0] if start == 0 else too_far
+        for j in range(max(start, 1), end + 1):
+            word_char = word[j-1]
+            value = previous_cells[j - 1 - previous_start] # matching the characters is always the best option when they are equal
+            if word_char != char:
+                # Replacement, insertion or deletion
+                if j < previous_end and previous_cells[j - previous_start] < value:
+                    value = previous_cells[j - previous_start]
+                if left < value:
+                    value = left
+                value += 1
+                
+                # Switch of the characters at rows i1 and i (with the characters in between deleted or inserted), i1 being the last row with word[j-1]
+                if last_column > 0 and value > 1:
+                    for h in range(len(history) - 1):
+                        if history[h][1] == word_char:
+                            k = last_column - 1 - history[h+1][2]
+                            if 0 <= k < len(history[h+1][3]):
+                                switch = history[h+1][3][k] + (i - history[h][0] - 1) + 1 + (j - last_column - 1)
+                                if switch < value:
+                                    value = switch
+                            break
+                if value > too_far:
+                    value = too_far
+            else:
+                last_column = j
+            cells.append(value)
+            left = value
+        
+        if node_word is not None and end == length and cells[-1] <= max_distance:
+            candidates[node_word] = cells[-1]
+        
+        # Pruning the branch when no cell is within the maximum distance (the next rows can't go below this minimum, switches included)
+        if min(cells) <= max_distance:
+            new_history = ((i, char, start, cells),) + history[:max_distance]
+            for next_char, child in children.items():
+                stack.append((child, next_char, i + 1, new_history))
+    
+    return candidates
+
 
+# Same as get_corrections, getting the candidate words by walking the vocabulary trie instead of generating every edit of the word
+def get_corrections_from_trie(word, probs, vocab_trie, n, max_distance=2):
+    '''
+    Input:
+        word: a user entered word to check for suggestions
+        probs: a dictionary that maps each word to its probability in the corpus
+        vocab_trie: the output of build_vocab_trie
+        n: number of possible word corrections you want returned in the dictionary
+        max_distance: maximum number of edits (any number, not only 1 or 2)
+    Output:
+        n_best: a list of tuples with the most probable n corrected words and their probabilities
+    '''
+    candidates = search_vocab_trie(word, vocab_trie, max_distance)
+    
+    # Keeping only the closest candidates, like get_corrections
+    suggestions_dict = {}
+    if len(candidates) > 0:
+        min_distance = min(candidates.values())
+        suggestions_dict = {candidate: probs[candidate] for candidate, distance in candidates.items() if distance == min_distance}
+    
     # Sorting the dictionary with the helper function Counter to get the most common words
     c = Counter(suggestions_dict)
     n_best = c.most_common(n) # list of tuples (word, probability) sorted by most common
     
     return n_best
+
+
+# Settings of the correction processes, set once per process by init_correction_worker
+WORKER_SETTINGS = {}
+
+
+# Method to store the correction settings in a worker process (so they are only sent once to every process)
+def init_correction_worker(probs, vocab, n, deletion_index):
+    WORKER_SETTINGS.update({"probs": probs, "vocab": vocab, "n": n, "deletion_index": deletion_index})
+
+
+# Method to correct one word with the settings of the worker process
+def correct_word(word):
+    '''
+    Input:
+        word: an unknown word
+    Output:
+        n_best: a list of tuples with the most probable n corrected words and their probabilities (see get_corrections)
+    '''
+    settings = WORKER_SETTINGS
+    if settings["deletion_index"] is not None:
+        return get_corrections_from_index(word, settings["probs"], settings["deletion_index"], settings["n"])
+    
+    return get_corrections(word, settings["probs"], settings["vocab"], settings["n"])
+
+
+# Method to identify the settings and the model used to correct the words (part of the cache keys of check_documents)
+def correction_model_key(probs, vocab_set, n, deletion_index):
+    '''
+    Input:
+        probs: a dictionary that maps each word to its probability in the corpus
+        vocab_set: a set containing all the vocabulary
+        n: number of corrections returned for every unknown word
+        deletion_index: the output of build_deletion_index, or None when get_corrections is used
+    Output:
+        model_key: a tuple with the correction method, n and fingerprints of the content of probs, vocab and the deletion index
+    '''
+    # Hashing the content (not the identity) of the model, so that a model changed in place or a new one reusing the same memory never hits stale entries
+    model_key = ("edits" if deletion_index is None else "deletion_index", n, hash(frozenset(probs.items())), hash(frozenset(vocab_set)))
+    if deletion_index is not None:
+        model_key += (deletion_index["max_distance"], deletion_index["prefix_length"], len(deletion_index["deletes"]))
+    
+    return model_key
+
+
+# Method to find the words of a document in the original text (before punctuation and numbers are removed)
+def token_spans(document, tokens):
+    '''
+    Input:
+        document: a string
+        tokens: the words of the cleaned document given by regex_tokenize_batch (before lowering them)
+    Output:
+        spans: a list with a tuple (start, end) for every word, so that document[start:end] is its original text
+    '''
+    # Positions in the original document of the characters kept by CLEAN_TABLE
+    cleaned = document.translate(CLEAN_TABLE)
+    if len(cleaned) == len(document):
+        offsets = range(len(document))
+    else:
+        offsets = [position for position, char in enumerate(document) if char not in REMOVED_CHARACTERS]
+    
+    # The tokenizer only splits the cleaned text, so the words are found in order
+    spans = []
+    start = 0
+    for token in tokens:
+        start = cleaned.find(token, start)
+        end = start + len(token)
+        spans.append((offsets[start], offsets[end - 1] + 1))
+        start = end
+    
+    return spans
+
+
+# Spell checker for many documents (or TMX segments): the vocabulary set and the fingerprint of the model are only computed once
+class SpellChecker:
+    '''
+    Input:
+        probs: a dictionary that maps each word to its probability in the corpus
+        vocab: a list or set containing all the vocabulary
+        n: number of corrections returned for every unknown word
+        deletion_index: If not None, the output of build_deletion_index to get the candidates (get_corrections is used otherwise)
+        processes: number of processes correcting the unknown words (1 to correct them in this process; by default, one per CPU)
+        cache: dictionary (OrderedDict) with the corrections already found, shared across calls and checkers (keyed by word and correction_model_key, so a different method or model never reuses them)
+        cache_size: maximum number of words kept in the cache
+    
+    The model (probs, vocab and deletion_index) must not be changed once the checker is created: create a new checker instead.
+    The pool of processes is kept until close is called (or the end of a with block).
+    '''
+    
+    def __init__(self, probs, vocab, n=3, deletion_index=None, processes=None, cache=CORRECTIONS_CACHE, cache_size=100000):
+        self.probs = probs
+        self.vocab_set = vocab if isinstance(vocab, (set, frozenset)) else set(vocab)
+        self.n = n
+        self.deletion_index = deletion_index
+        self.processes = processes if processes != None else os.cpu_count() or 1
+        self.cache = cache
+        self.cache_size = cache_size
+        self.model_key = correction_model_key(probs, self.vocab_set, n, deletion_index)
+        self.executor = None
+    
+    # Method to get the pool of processes, started the first time it is needed and kept across calls (the model is only sent once to every process)
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.processes, initializer=init_correction_worker, initargs=(self.probs, self.vocab_set, self.n, self.deletion_index))
+        
+        return self.executor
+    
+    # Method to stop the pool of processes
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    # Method to spell-check many documents at once
+    def check(self, documents):
+        '''
+        Input:
+            documents: a list of strings (documents, sentences or segments)
+        Output:
+            results: a list with, for every document, a list of tuples ((start, end) of the word in the document, unknown word, its corrections)
+        '''
+        vocab_set, cache, model_key = self.vocab_set, self.cache, self.model_key
+        
+        # Tokenizing all the documents in one batch (same processing as process_sentence, keeping the case to find the words in the documents)
+        documents_tokens = regex_tokenize_batch([document.translate(CLEAN_TABLE) for document in documents])
+        documents_words = [[token.lower() for token in tokens] for tokens in documents_tokens]
+        
+        # Every distinct unknown word is only corrected once, whatever the number of times it appears
+        unknown_words = {word for words in documents_words for word in words if word not in vocab_set}
+        corrections = {}
+        for word in unknown_words:
+            if (model_key, word) in cache:
+                cache.move_to_end((model_key, word))
+                corrections[word] = cache[(model_key, word)]
+        missing = sorted(unknown_words - corrections.keys())
+        
+        # Correcting the words that are not in the cache, in a pool of processes when there are enough of them
+        processes = self.processes
+        if processes > 1 and len(missing) > processes:
+            new_corrections = list(self.get_executor().map(correct_word, missing, chunksize=max(1, len(missing) // (processes * 4))))
+        else:
+            init_correction_worker(self.probs, vocab_set, self.n, self.deletion_index)
+            new_corrections = [correct_word(word) for word in missing]
+        
+        # Updating the cache and dropping the least recently used words when it is full
+        for word, word_corrections in zip(missing, new_corrections):
+            corrections[word] = word_corrections
+            cache[(model_key, word)] = word_corrections
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        
+        # Mapping the corrections back to the unknown words in the original text of every document
+        results = []
+        for document, tokens, words in zip(documents, documents_tokens, documents_words):
+            positions = [position for position, word in enumerate(words) if word not in vocab_set]
+            spans = token_spans(document, tokens) if len(positions) > 0 else []
+            results.append([(spans[position], words[position], corrections[words[position]]) for position in positions])
+        
+        return results
+
+
+# Method to spell-check a single batch of documents (use a SpellChecker to check many batches with the same model)
+def check_documents(documents, probs, vocab, n=3, deletion_index=None, processes=None, cache=CORRECTIONS_CACHE, cache_size=100000):
+    '''
+    Input:
+        documents: a list of strings (documents, sentences or segments)
+        probs, vocab, n, deletion_index, processes, cache, cache_size: see SpellChecker
+    Output:
+        results: a list with, for every document, a list of tuples ((start, end) of the word in the document, unknown word, its corrections)
+    '''
+    with SpellChecker(probs, vocab, n, deletion_index, processes, cache, cache_size) as checker:
+        results = checker.check(documents)
+    
+    return results